@@ -7,9 +7,10 @@ POV_FILENAME = 'out.pov'
 
 
 class CastleBuilder(object):
-    def __init__(self, illustrator, features=None, castle_class=CastleTwoLevel):
+    def __init__(self, illustrator, features=None, castle_class=CastleTwoLevel, size=(150, 150)):
         self.illustrator = illustrator
         self.castle_class = castle_class
+        self.size = size
         if features is None:
             features = [
                 # Keep in order from largest to smallest for best coverage
@@ -25,15 +26,13 @@ class CastleBuilder(object):
 
         with timed(is_verbose(1), 'Generating castle...', 'Castle generated in {0:.3f}s'):
             castle = self.castle_class(
-                150, 150, verbose=verbose,
+                *self.size, verbose=verbose,
                 feature_factories=self.features
             )
 
         with timed(is_verbose(1), 'Writing castle...', 'Castle written in {0:.3f}s'):
-            castle.draw(self.illustrator)
             with open(filename, 'w') as f:
-                f.write(self.illustrator.make())
-            self.illustrator.reset()  # TODO: get rid of state here!
+                self.illustrator.dump(castle, f)
 
         if processor:
             processor.process_pov(filename)
@@ -143,18 +143,36 @@ class CastleTwoLevel(object):
         return routes
 
     def draw(self, illustrator):
+        self.draw_features(illustrator)
+
+        if self.verbose >= 2:
+            print('Drawing walls...')
+
+        for name, x, y in self.wall_names():
+            getattr(illustrator, 'draw_' + name)(x, y)
+
+    def draw_features(self, illustrator):
         if self.verbose >= 2:
             print('Drawing {} features...'.format(len(self.features)))
 
         for feature, x, y, z, data in self.features:
             illustrator.draw_feature(feature, x-self.x/2, y-self.y/2, z, *data)
 
-        if self.verbose >= 2:
-            print('Drawing walls...')
-
-        for wall in self.walls:
-            fun = getattr(illustrator, 'draw_' + wall.name(self.topology))
-            fun(wall.pos[0] - self.x/2, wall.pos[1] - self.y/2)
+    def wall_names(self):
+        """
+        Yield the name (like `archx`) and centered position of each wall, as it's needed.  Walls
+        come line by line, in order along each line, so runs of them lie end to end.
+        """
+        for wall in sorted(self.walls, key=self._wall_order):
+            yield wall.name(self.topology), wall.pos[0] - self.x/2, wall.pos[1] - self.y/2
+
+    @staticmethod
+    def _wall_order(wall):
+        # Walls named ...x run along x, so each line has fixed y; and vice versa
+        if wall.dim == 'x':
+            return wall.dim, wall.pos[1], wall.pos[0]
+        else:
+            return wall.dim, wall.pos[0], wall.pos[1]
 
 
 # TODO: Does this even work anymore?
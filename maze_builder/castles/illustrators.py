@@ -1,6 +1,6 @@
 import pkgutil
-import jinja2
 import random
+from maze_builder import templates
 from maze_builder.random2 import weighted_choice
 
 
@@ -12,7 +12,33 @@ def resource(resource_name):
 
 
 def template(template_name, **kwargs):
-    return jinja2.Template(resource(template_name)).render(**kwargs)
+    return templates.render(RESOURCE_PACKAGE, template_name, **kwargs)
+
+
+def merge_runs(walls):
+    """
+    Merge runs of the same wall command lying end to end into spans, yielding `(command, coords,
+    length)`.  Commands ending in X run along x and the rest along y; `walls` should come in
+    order along each line, as from `CastleTwoLevel.wall_names`.
+    """
+    run = None
+    for command, coords in walls:
+        if run is not None:
+            run_command, run_coords, length = run
+            axis = 0 if command.endswith('X') else 1
+            if command == run_command and all(
+                c == rc + (length if i == axis else 0) for i, (c, rc) in enumerate(zip(coords, run_coords))
+            ):
+                run = run_command, run_coords, length + 1
+                continue
+            yield run
+        run = command, coords, 1
+    if run is not None:
+        yield run
+
+
+def write(fp, template_name, **kwargs):
+    templates.dump(fp, RESOURCE_PACKAGE, template_name, **kwargs)
 
 
 class TemplateIllustrator(object):
@@ -27,6 +53,16 @@ class TemplateIllustrator(object):
             tower='MakeTower',
             stair='MakeStair',
         )
+        self.wall_map = dict(
+            wallx='MakeWallX',
+            wally='MakeWallY',
+            archx='MakeArchX',
+            archy='MakeArchY',
+            openx='MakeOpenX',
+            openy='MakeOpenY',
+            blockx='MakeBlockX',
+            blocky='MakeBlockY',
+        )
 
     def reset(self):
         self.walls = list()
@@ -62,7 +98,27 @@ class TemplateIllustrator(object):
     def make(self):
         return template(
             self.template,
-            walls=self.walls,
+            walls=merge_runs(self.walls),
+            features=self.features,
+            seed=random.randint(1, 9999)
+        )
+
+    def iter_walls(self, castle, z=0):
+        for name, x, y in castle.wall_names():
+            yield self.wall_map[name], (x, y, z)
+
+    def dump(self, castle, fp):
+        """
+        Write the castle straight to the file `fp`; walls are rendered as they're generated,
+        so they're never all held at once, with runs merged into spans.
+        """
+        self.reset()
+        castle.draw_features(self)
+        write(
+            fp,
+            self.template,
+            walls=merge_runs(self.iter_walls(castle)),
             features=self.features,
             seed=random.randint(1, 9999)
         )
+        self.reset()
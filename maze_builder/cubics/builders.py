@@ -1,8 +1,16 @@
 from maze_builder.util import timed, is_verbose
-from .cubic import Cubic
+from .cubic import Cubic, DenseCubic, stream_exit_rows
 from .illustrators.imaging import *
 from .illustrators.unicode import *
-from PIL import ImageChops
+from maze_builder.pngwriter import PngWriter
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageChops
+import functools
+import itertools
+import multiprocessing
+import numpy
+import os
+import random
 
 
 POV_FILENAME = 'out.pov'
@@ -11,19 +19,27 @@ POV_FILENAME = 'out.pov'
 PNG_FILENAME = 'out.png'
 
 
+def fill(maze, algorithm=None):
+    """Fill with the named algorithm from `maze_builder.mazes.algorithms`, or the maze's own `fill`"""
+    if algorithm is None:
+        return maze.fill()
+    else:
+        return maze.generate(algorithm)
+
+
 class UnicodeBuilder(object):
-    def __init__(self, name, width, height=None, illustrator=UnicodeFullBlockIllustrator()):
+    def __init__(self, name, width, height=None, illustrator=UnicodeFullBlockIllustrator(), algorithm=None):
         self.name = name
         self.width = width
         self.height = height or width
         self.illustrator = illustrator
+        self.algorithm = algorithm
 
     def build(self, processor, verbose=0, filename=POV_FILENAME):
         # Generate maze
 
         with timed(is_verbose(1), 'Generating maze...', 'Maze generated in {0:.3f}s'):
-            maze = Cubic(
-            ).prepare(self.width, self.height, 1).fill(
+            maze = fill(DenseCubic().prepare(self.width, self.height, 1), self.algorithm
             ).request_feature(1, 1
             ).request_feature(1, 1
             )
@@ -40,16 +56,17 @@ class UnicodeBuilder(object):
 
 
 class ImageBuilder(object):
-    def __init__(self, width, height=None, illustrator=ImageBlockIllustrator()):
+    def __init__(self, width, height=None, illustrator=ImageBlockIllustrator(), algorithm=None):
         self.width = width
         self.height = height or width
         self.illustrator = illustrator
+        self.algorithm = algorithm
 
     def build(self, processor, verbose=0, filename=PNG_FILENAME):
         # Generate maze
 
         with timed(is_verbose(1), 'Generating maze image...', 'Maze image generated in {0:.3f}s'):
-            maze = Cubic().prepare((self.width-1)//2, (self.height-1)//2).fill()
+            maze = fill(DenseCubic().prepare((self.width-1)//2, (self.height-1)//2), self.algorithm)
 
         with timed(is_verbose(1), 'Writing maze image...', 'Maze image written in {0:.3f}s'):
             image = self.illustrator.draw(maze)
@@ -59,28 +76,110 @@ class ImageBuilder(object):
             processor.tweet(filename=filename)
 
 
+class StreamingImageBuilder(object):
+    """
+    Like `ImageBuilder`, but generates & writes the maze a row at a time, so memory use only
+    depends on the width; for very tall images.
+    """
+    def __init__(self, width, height=None, illustrator=ImageBlockIllustrator()):
+        self.width = width
+        self.height = height or width
+        self.illustrator = illustrator
+
+    def build(self, processor, verbose=0, filename=PNG_FILENAME):
+        width = (self.width-1)//2
+        height = (self.height-1)//2
+
+        with timed(is_verbose(1), 'Generating & writing maze image...', 'Maze image written in {0:.3f}s'):
+            with open(filename, 'wb') as f, PngWriter(f, 2*width+1, 2*height+1) as png:
+                png.write_rows(self.illustrator.draw_scanlines(stream_exit_rows(width, height), width))
+
+        if processor:
+            processor.tweet(filename=filename)
+
+
+def _blend_add(image0, image1):
+    return numpy.minimum(image0.astype(numpy.uint16) + image1, 255).astype(numpy.uint8)
+
+
+def _blend_multiply(image0, image1):
+    return (image0.astype(numpy.uint16) * image1 // 255).astype(numpy.uint8)
+
+
+BLENDS = {
+    'add': _blend_add,
+    'multiply': _blend_multiply,
+}
+
+
+# Smaller layers are drawn quicker in process than by starting a pool & pickling them back
+POOL_PIXELS = 1500 * 1500
+
+
+def _build_layer(illustrator, width, height, algorithm, seed):
+    random.seed(seed)
+    maze = fill(DenseCubic().prepare((width-1)//2, (height-1)//2), algorithm)
+    return numpy.asarray(illustrator.draw(maze))
+
+
+def _build_layer_here(*layer):
+    """`_build_layer` in this process, leaving its random state as it was"""
+    state = random.getstate()
+    try:
+        return _build_layer(*layer)
+    finally:
+        random.setstate(state)
+
+
 class ImageBuilderCombined(object):
-    def __init__(self, width, height, illustrators, fun=ImageChops.multiply):
+    """
+    Combines images of several mazes, one per illustrator.  Each is generated & drawn separately
+    (in a pool of `workers` processes, by default one per layer up to the CPU count, once layers
+    have at least `pool_pixels`) and then folded together with `fun`, an `ImageChops` function or
+    its name.
+    """
+    def __init__(self, width, height, illustrators, fun='multiply', algorithm=None, workers=None,
+                 pool_pixels=POOL_PIXELS):
         self.width = width
         self.height = height
         self.illustrators = illustrators
+        self.algorithm = algorithm
+        self.workers = workers
+        self.pool_pixels = pool_pixels
+        self.blend = BLENDS.get(fun) if isinstance(fun, str) else None
         if isinstance(fun, str):
             fun = getattr(ImageChops, fun)
         self.fun = fun
 
+    def count_workers(self):
+        if self.width * self.height < self.pool_pixels:
+            return 1
+        if multiprocessing.current_process().daemon:
+            # Already a pool worker (e.g. building a batch), which can't have children of its own
+            return 1
+        return min(len(self.illustrators), self.workers or os.cpu_count() or 1)
+
     def build(self, processor, verbose=0, filename=PNG_FILENAME):
-        # Generate maze
+        workers = self.count_workers()
+        layers = [
+            (illustrator, self.width, self.height, self.algorithm, random.getrandbits(32))
+            for illustrator in self.illustrators
+        ]
+
+        # Generate & draw mazes
         with timed(is_verbose(1), 'Generating mazes...', 'All mazes generated in {0:.3f}s'):
-            mazes = list()
-            for i in range(len(self.illustrators)):
-                with timed(is_verbose(2), 'Generating maze #{}...'.format(i+1), 'Maze generated in {0:.3f}s'):
-                    mazes.append(Cubic().prepare((self.width-1)//2, (self.height-1)//2).fill())
+            if workers > 1:
+                with ProcessPoolExecutor(workers) as executor:
+                    images = list(executor.map(_build_layer, *zip(*layers)))
+            else:
+                images = list(itertools.starmap(_build_layer_here, layers))
 
         with timed(is_verbose(1), 'Combining maze images...', 'Maze images combined in {0:.3f}s'):
-            images = [ill.draw(maze) for ill, maze in zip(self.illustrators, mazes)]
-            image = images[0]
-            for multiplier in images[1:]:
-                image = self.fun(image, multiplier)
+            if self.blend:
+                image = functools.reduce(self.blend, images)
+                image = Image.fromarray(image)
+            else:
+                image = functools.reduce(self.fun, (Image.fromarray(image) for image in images))
             image.save(filename)
 
         if processor:
@@ -88,23 +187,23 @@ class ImageBuilderCombined(object):
 
 
 class CubicPovBuilder(object):
-    def __init__(self, illustrator, x, y=None, z=1):
+    def __init__(self, illustrator, x, y=None, z=1, algorithm=None):
         self.illustrator = illustrator
         self.x, self.y, self.z = x, (y or x), z
+        self.algorithm = algorithm
 
     def build(self, processor, verbose=0, filename=POV_FILENAME):
         # Generate maze
 
         with timed(is_verbose(1), 'Generating maze...', 'Maze generated in {0:.3f}s'):
-            maze = Cubic().prepare(
+            maze = fill(DenseCubic().prepare(
                 self.x, self.y, self.z,
                 origin=(-(self.x//2), -(self.y//2), -(self.z//2))
-            ).fill()
+            ), self.algorithm)
 
         with timed(is_verbose(1), 'Writing maze...', 'Maze written in {0:.3f}s'):
-            data = self.illustrator.draw(maze)
             with open(filename, 'w') as f:
-                f.write(data)
+                self.illustrator.dump(maze, f)
 
         if processor:
             processor.process_pov(filename)
@@ -130,24 +229,24 @@ class SeededPovBuilder(object):
             )
 
         with timed(is_verbose(1), 'Writing maze...', 'Maze written in {0:.3f}s'):
-            data = self.illustrator.draw(maze)
             with open(filename, 'w') as f:
-                f.write(data)
+                self.illustrator.dump(maze, f)
 
         if processor:
             processor.process_pov(filename)
 
 
 class FilledCubicGenerator(object):
-    def __init__(self, x, y=None, z=1, features=[]):
+    def __init__(self, x, y=None, z=1, features=[], algorithm=None):
         self.x = x
         self.y = y or x
         self.z = z
         self.features = features
+        self.algorithm = algorithm
 
     def __call__(self, verbose=1):
         with timed(is_verbose(1), 'Generating maze...', 'Maze generated in {0:.3f}s'):
-            maze = Cubic().prepare(
+            maze = DenseCubic().prepare(
                 self.x, self.y, self.z,
                 origin=(-self.x//2, -self.y//2, -self.z//2)
             )
@@ -158,7 +257,7 @@ class FilledCubicGenerator(object):
                 while callable(feature):
                     feature = feature()
                 maze.request_feature(*feature)
-            maze.fill()
+            fill(maze, self.algorithm)
             return maze
 
 
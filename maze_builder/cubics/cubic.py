@@ -1,27 +1,34 @@
 from maze_builder.mazes.maze import Topology, Route
+from maze_builder.mazes.equivalence import DisjointSets
+from maze_builder.mazes.algorithms import generate, eller_rows
+from .vectorized import spanning_tree
+from array import array
+import collections.abc
+import itertools
 import random
 import math
+import numpy
 
 
 INF = float('inf')
 
 
+# Exit bits, one per direction a room can be left in
+PLUS_X, PLUS_Y, PLUS_Z, MINUS_X, MINUS_Y, MINUS_Z = (1 << i for i in range(6))
+DIRECTIONS = ((1, 0, 0), (0, 1, 0), (0, 0, 1), (-1, 0, 0), (0, -1, 0), (0, 0, -1))
+
+
 def _maybe_call(n):
     return n() if callable(n) else n
 
 
-class Room(object):
-    def __init__(self, x=0, y=0, z=0):
-        self.x, self.y, self.z = x, y, z
-        self.exits = set()
-        self.entrances = set()
-        self.feature = None
+def _direction(coords0, coords1):
+    delta = tuple(c1 - c0 for c0, c1 in zip(coords0, coords1))
+    return DIRECTIONS.index(delta) if delta in DIRECTIONS else None
 
-    def __hash__(self):
-        return hash((self.x, self.y, self.z))
 
-    def __eq__(self, other):
-        return (self.x, self.y, self.z) == (other.x, other.y, other.z)
+class RoomBase(object):
+    __slots__ = ()
 
     def __lt__(self, other):
         return (self.x, self.y, self.z) < (other.x, other.y, other.z)
@@ -43,6 +50,74 @@ class Room(object):
                     yield self.coords(i, j, k)
 
 
+class Room(RoomBase):
+    def __init__(self, x=0, y=0, z=0):
+        self.x, self.y, self.z = x, y, z
+        self.exits = set()
+        self.entrances = set()
+        self.feature = None
+
+    def __hash__(self):
+        return hash((self.x, self.y, self.z))
+
+    def __eq__(self, other):
+        return (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+
+class GridRoom(RoomBase):
+    """
+    Lightweight view of a room of a `DenseCubic`, which holds all of the room's actual state.
+    """
+    __slots__ = ('cubic', 'index')
+
+    def __init__(self, cubic, index):
+        self.cubic = cubic
+        self.index = index
+
+    @property
+    def x(self):
+        return self.cubic.minx + self.index % self.cubic.size[0]
+
+    @property
+    def y(self):
+        return self.cubic.miny + self.index // self.cubic.size[0] % self.cubic.size[1]
+
+    @property
+    def z(self):
+        return self.cubic.minz + self.index // (self.cubic.size[0] * self.cubic.size[1])
+
+    @property
+    def feature(self):
+        return self.cubic.feature_table[self.cubic.feature_ids[self.index]]
+
+    @feature.setter
+    def feature(self, feature):
+        self.cubic.feature_ids[self.index] = self.cubic.feature_id(feature)
+
+    @property
+    def exits(self):
+        return set(Route((self, room)) for room in self._neighbors(range(3, 6)))
+
+    @property
+    def entrances(self):
+        return set(Route((room, self)) for room in self._neighbors(range(3)))
+
+    def _neighbors(self, directions):
+        exits = self.cubic.exits[self.index]
+        for direction in directions:
+            if exits & (1 << direction):
+                yield self.cubic.get_room(self.coords(*DIRECTIONS[direction]))
+
+    def __hash__(self):
+        # Like `Room`, as they compare equal
+        return hash((self.x, self.y, self.z))
+
+    def __eq__(self, other):
+        if isinstance(other, GridRoom) and self.cubic is other.cubic:
+            return self.index == other.index
+        return (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+
 class Feature(object):
     def __init__(self, rooms, name=None):
         self.rooms = sorted(rooms)
@@ -61,6 +136,7 @@ class Cubic(object):
     def __init__(self):
         self.topology = Topology()
         self.rooms = dict()
+        self.exits = dict()  # Dict from room coords to exit bits
 
         self.minx = INF
         self.miny = INF
@@ -78,17 +154,15 @@ class Cubic(object):
     def request_feature(self, width, length=None, height=1, name=None, attempts=20, connected=True):
         length = length or width
         allrooms = list(self.rooms.values())
-        print(allrooms)
         for _ in range(attempts):
             r = random.choice(allrooms)
-            print((len(allrooms), r))
             rooms = [self.get_room(c, make=False) for c in r.coords_boxing(width, length, height)]
             if not all(rooms):
                 continue
             if any(room.feature for room in rooms):
                 continue
             if connected:
-                self.topology.force(*self.topology.routes_connecting(rooms))
+                self.connect_rooms(rooms)
             feature = Feature(rooms, name)
             self.features.append(feature)
             break
@@ -120,6 +194,38 @@ class Cubic(object):
 
         return self.rooms.get(coords)
 
+    def exit_bits(self, coords):
+        if len(coords) == 2:
+            coords += (self.minz,)
+        return self.exits.get(coords, 0)
+
+    def exit_map(self, z=None):
+        """
+        Exit bits of every room in the `z` layer (default lowest), as a list of rows indexed
+        `[y - miny][x - minx]`.  Missing rooms have no exits.
+        """
+        z = self.minz if z is None else z
+        rows = [bytearray(1 + self.maxx - self.minx) for _ in range(1 + self.maxy - self.miny)]
+        for (x, y, rz), exits in self.exits.items():
+            if rz == z:
+                rows[y - self.miny][x - self.minx] = exits
+        return rows
+
+    def neighbors(self, coords):
+        if len(coords) == 2:
+            coords += (self.minz,)
+        for direction in DIRECTIONS:
+            neighbor = tuple(c + d for c, d in zip(coords, direction))
+            if self.get_room(neighbor, make=False) is not None:
+                yield neighbor
+
+    def connect(self, coords0, coords1):
+        rooms = self.get_room(coords0, make=False), self.get_room(coords1, make=False)
+        return all(rooms) and self.offer_route(rooms)
+
+    def connect_rooms(self, rooms):
+        self._activate(self.topology.force(*self.topology.routes_connecting(rooms)))
+
     def any_active_route_connecting(self, *coords_list):
         return self.topology.any_active_route_connecting(self.get_room(c, make=False) for c in coords_list)
 
@@ -131,12 +237,9 @@ class Cubic(object):
             return None
 
     def offer_route(self, *routes):
-        success = False
-        for route in self.topology.offer(*routes):
-            success = True
-            route.rooms[0].exits.add(route)
-            route.rooms[-1].entrances.add(route)
-        return success
+        routes = self.topology.offer(*routes)
+        self._activate(routes)
+        return bool(routes)
 
     def prepare(self, x, y, z=1, origin=(0, 0, 0)):
         x, y, z = int(x), int(y), int(z)
@@ -173,6 +276,10 @@ class Cubic(object):
 
         return self
 
+    def generate(self, algorithm='kruskal', **kwargs):
+        """Fill using one of the algorithms in `maze_builder.mazes.algorithms`"""
+        return generate(self, algorithm, **kwargs)
+
     def seed(
             self, connection_attempts, origin=(0,0,0),
             x=1, y=None, z=None,
@@ -195,16 +302,258 @@ class Cubic(object):
                 self.make_route(seed.coords_along(_maybe_call(nz), z=-1)),
             ]
 
-            return set(route for route in routes if route)
+            return [route for route in routes if route]
 
         seed = self.get_room(origin)
-        new_routes = set()
+        new_routes = generate_routes(seed)
 
-        new_routes.update(generate_routes(seed))
         for _ in range(connection_attempts):
-            proposed_route = random.sample(new_routes, 1)[0]
-            new_routes.discard(proposed_route)
+            if not new_routes:
+                break
+            # Swap a random route to the end, so it can be removed in constant time
+            i = random.randrange(len(new_routes))
+            new_routes[i], new_routes[-1] = new_routes[-1], new_routes[i]
+            proposed_route = new_routes.pop()
             if self.offer_route(proposed_route):
-                new_routes.update(generate_routes(proposed_route.rooms[-1]))
+                new_routes.extend(generate_routes(proposed_route.rooms[-1]))
 
         return self
+
+    # Internal
+
+    def _activate(self, routes):
+        for route in routes:
+            route.rooms[0].exits.add(route)
+            route.rooms[-1].entrances.add(route)
+            for room0, room1 in zip(route.rooms, route.rooms[1:]):
+                direction = _direction(room0.coords(), room1.coords())
+                if direction is not None:
+                    self.exits[room0.coords()] = self.exits.get(room0.coords(), 0) | (1 << direction)
+                    self.exits[room1.coords()] = self.exits.get(room1.coords(), 0) | (1 << (direction + 3) % 6)
+
+
+class GridRooms(collections.abc.Mapping):
+    """
+    Read-only mapping from coordinates to the `GridRoom` views of a `DenseCubic`.
+    """
+    def __init__(self, cubic):
+        self.cubic = cubic
+
+    def __len__(self):
+        return len(self.cubic.exits)
+
+    def __iter__(self):
+        cubic = self.cubic
+        for z in range(cubic.minz, cubic.minz + cubic.size[2]):
+            for y in range(cubic.miny, cubic.miny + cubic.size[1]):
+                for x in range(cubic.minx, cubic.minx + cubic.size[0]):
+                    yield (x, y, z)
+
+    def __contains__(self, coords):
+        return self.cubic.index_of(coords) is not None
+
+    def __getitem__(self, coords):
+        room = self.cubic.get_room(coords, make=False)
+        if room is None:
+            raise KeyError(coords)
+        return room
+
+
+class DenseCubic(Cubic):
+    """
+    Cubic whose rooms exactly fill the box given to `prepare`.
+
+    Rooms are addressed by linear index (x varies fastest, then y, then z) and their state is held
+    in compact per-room arrays: an exit bitmask (see `DIRECTIONS`) and a feature id.  Coordinates
+    follow from the index, and `get_room` hands out `GridRoom` views on demand.  The `topology` is
+    only built, as a read-only snapshot, when something asks for it.
+    """
+    def __init__(self):
+        super().__init__()
+        self._topology = None
+        self.rooms = GridRooms(self)
+        self.size = (0, 0, 0)
+        self.exits = bytearray()
+        self.feature_ids = array('H')
+        self.feature_table = [None]
+        self._strides = (1, 0, 0)
+        self._spaces = DisjointSets()
+
+    @property
+    def topology(self):
+        if self._topology is None:
+            self._topology = self._make_topology()
+        return self._topology
+
+    @topology.setter
+    def topology(self, topology):
+        self._topology = topology
+
+    def index_of(self, coords):
+        if len(coords) == 2:
+            coords += (self.minz,)
+        (sx, sy, sz), (x, y, z) = self.size, coords
+        i, j, k = x - self.minx, y - self.miny, z - self.minz
+        if 0 <= i < sx and 0 <= j < sy and 0 <= k < sz:
+            return int(i + sx * (j + sy * k))
+        else:
+            return None
+
+    def coords_of(self, index):
+        j, i = divmod(index, self.size[0])
+        k, j = divmod(j, self.size[1])
+        return (self.minx + i, self.miny + j, self.minz + k)
+
+    def feature_id(self, feature):
+        if feature not in self.feature_table:
+            self.feature_table.append(feature)
+        return self.feature_table.index(feature)
+
+    def exit_bits(self, coords):
+        index = self.index_of(coords)
+        return self.exits[index] if index is not None else 0
+
+    def exit_array(self):
+        """Writable (z, y, x) NumPy view of the exit bits"""
+        return numpy.frombuffer(self.exits, dtype=numpy.uint8).reshape(self.size[::-1])
+
+    def exit_map(self, z=None):
+        sx, sy, _ = self.size
+        start = sx * sy * ((self.minz if z is None else z) - self.minz)
+        exits = memoryview(self.exits)
+        return [exits[i:i + sx] for i in range(start, start + sx * sy, sx)]
+
+    def get_room(self, coords, make=True):
+        index = self.index_of(coords)
+        if index is not None:
+            return GridRoom(self, index)
+        elif make:
+            raise RuntimeError('Dense cubic cannot grow beyond its prepared bounds: {}'.format(coords))
+        else:
+            return None
+
+    def connect_rooms(self, rooms):
+        indices = set(room.index for room in rooms)
+        for index in indices:
+            for direction in range(3):
+                if self._neighbor(index, direction) in indices:
+                    self._open(index, direction)
+
+    def any_active_route_connecting(self, *coords_list):
+        rooms = [self.get_room(coords, make=False) for coords in coords_list]
+        for room0, room1 in itertools.combinations(rooms, 2):
+            if room0 is None or room1 is None:
+                continue
+            direction = _direction(room0.coords(), room1.coords())
+            if direction is not None and self.exits[room0.index] & (1 << direction):
+                return Route((room0, room1))
+        else:
+            return None
+
+    def offer_route(self, *routes):
+        steps = [self._step(route) for route in routes]
+        for index, direction in steps:
+            other = self._neighbor(index, direction)
+            if self.exits[index] & (1 << direction) or self._spaces.find(index) == self._spaces.find(other):
+                return False
+        for index, direction in steps:
+            self._open(index, direction)
+        return bool(steps)
+
+    def prepare(self, x, y, z=1, origin=(0, 0, 0)):
+        if self.exits:
+            raise RuntimeError('Dense cubic can only be prepared once')
+
+        x, y, z = int(x), int(y), int(z)
+        if any(o != int(o) for o in origin):
+            raise RuntimeError('Dense cubic origin must be whole numbers: {}'.format(origin))
+        ox, oy, oz = (int(o) for o in origin)
+
+        self.size = (x, y, z)
+        self._strides = (1, x, x * y)
+        self.minx, self.miny, self.minz = ox, oy, oz
+        self.maxx, self.maxy, self.maxz = ox + x - 1, oy + y - 1, oz + z - 1
+
+        self.exits = bytearray(x * y * z)
+        self.feature_ids = array('H', bytes(2 * x * y * z))
+        self._spaces = DisjointSets()
+        self._spaces.grow(x * y * z)
+
+        return self
+
+    def fill(self):
+        exits, labels = spanning_tree(self.size[::-1], self._spaces.parents)
+        exit_array = self.exit_array().reshape(-1)
+        exit_array |= exits
+        numpy.frombuffer(self._spaces.parents, dtype=numpy.dtype('l'))[:] = labels
+        self._topology = None
+
+        return self
+
+    def seed(self, *args, **kwargs):
+        raise RuntimeError('Dense cubic must be prepared & filled, it cannot be seeded')
+
+    # Internal
+
+    def _neighbor(self, index, direction):
+        axis = direction % 3
+        stride, size = self._strides[axis], self.size[axis]
+        coord = index // stride % size
+        if direction < 3:
+            return index + stride if coord + 1 < size else None
+        else:
+            return index - stride if coord > 0 else None
+
+    def _step(self, route):
+        rooms = route.rooms if isinstance(route, Route) else route
+        direction = _direction(rooms[0].coords(), rooms[1].coords()) if len(rooms) == 2 else None
+        if direction is None:
+            raise RuntimeError('Dense cubic routes must join two neighboring rooms: {}'.format(route))
+        return rooms[0].index, direction
+
+    def _open(self, index, direction):
+        other = self._neighbor(index, direction)
+        self.exits[index] |= 1 << direction
+        self.exits[other] |= 1 << ((direction + 3) % 6)
+        self._spaces.union(index, other)
+        self._topology = None
+
+    def _make_topology(self):
+        # Routes point from each room to its lower neighbors, just as in `Cubic.prepare`
+        routes, active_routes = list(), list()
+        for index, exits in enumerate(self.exits):
+            room = GridRoom(self, index)
+            for direction in range(3, 6):
+                other = self._neighbor(index, direction)
+                if other is not None:
+                    route = Route((room, GridRoom(self, other)))
+                    routes.append(route)
+                    if exits & (1 << direction):
+                        active_routes.append(route)
+
+        topology = Topology()
+        topology.teach(*routes)
+        topology.force(*active_routes)
+        return topology
+
+
+def stream_exit_rows(width, height=None, **kwargs):
+    """
+    Generate a 2D maze a row at a time with Eller's algorithm, yielding a bytearray of exit bits
+    per row of `width` rooms.  Only one row is kept, so `height` can be huge, or None to go on
+    for as long as rows are asked for; `kwargs` go to `eller_rows`.
+    """
+    above = bytes(width)
+    for east, south in eller_rows(width, height, **kwargs):
+        row = bytearray(width)
+        for i in range(width):
+            exits = MINUS_Y if above[i] else 0
+            if east[i]:
+                exits |= PLUS_X
+            if i and east[i-1]:
+                exits |= MINUS_X
+            if south[i]:
+                exits |= PLUS_Y
+            row[i] = exits
+        yield row
+        above = south
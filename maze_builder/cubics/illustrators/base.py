@@ -1,4 +1,13 @@
 from maze_builder.random2 import weighted_choice, Choice
+from maze_builder.cubics.cubic import PLUS_X, PLUS_Y, MINUS_X, MINUS_Y
+
+
+def exits_at(exit_map, i, j):
+    """Exit bits at `exit_map[j][i]`, or none if that's outside the map"""
+    if 0 <= j < len(exit_map) and 0 <= i < len(exit_map[j]):
+        return exit_map[j][i]
+    else:
+        return 0
 
 
 class LineIllustratorBase(object):
@@ -19,14 +28,13 @@ class LineIllustratorBase(object):
 
     def draw(self, cubic):
         self.prepare(1+cubic.maxx-cubic.minx, 1+cubic.maxy-cubic.miny)
-        z = cubic.minz
-        for x in range(cubic.minx, cubic.maxx+2):
-            for y in range(cubic.miny, cubic.maxy+2):
-                xo = x - cubic.minx
-                yo = y - cubic.miny
-                if not cubic.any_active_route_connecting((x, y), (x-1, y)):
+        exit_map = cubic.exit_map(cubic.minz)
+        for xo in range(cubic.maxx-cubic.minx+2):
+            for yo in range(cubic.maxy-cubic.miny+2):
+                exits = exits_at(exit_map, xo, yo)
+                if not exits & MINUS_X:
                     self.draw_wall((xo, yo), (xo, yo+1))
-                if not cubic.any_active_route_connecting((x, y), (x, y-1)):
+                if not exits & MINUS_Y:
                     self.draw_wall((xo, yo), (xo+1, yo))
 
         for feature in cubic.features:
@@ -54,43 +62,36 @@ class BlockIllustratorBase(object):
 
     def draw(self, cubic):
         width = 1 + cubic.maxx - cubic.minx
-        height = 1 + cubic.maxy - cubic.miny
-        ox = cubic.minx
-        oy = cubic.miny
         z = cubic.maxz
         if cubic.maxz != cubic.minz:
             raise RuntimeError('I can only draw 2D images')
-        rows = [[None for _ in range(2*width+1)] for _ in range(2*height+1)]
-
-        # Boundaries (left & top)
-        for i in range(width):
-            rows[0][i*2+1] = self.xwalls()
-        for j in range(height):
-            rows[j*2+1][0] = self.ywalls()
-
-        # Junctions everywhere
-        for i in range(width+1):
-            for j in range(height+1):
-                rows[j*2][i*2] = self.junctions()
-
-        # Rooms and halls
-        for i in range(width):
-            x = ox + i
-            for j in range(height):
-                y = oy + j
-                rows[j*2+1][i*2+1] = self.rooms()
-
-                if cubic.any_active_route_connecting((x, y, z), (x+1, y, z)):
-                    rows[j*2+1][i*2+2] = self.xhalls()
-                else:
-                    rows[j*2+1][i*2+2] = self.ywalls()
-
-                if cubic.any_active_route_connecting((x, y, z), (x, y+1, z)):
-                    rows[j*2+2][i*2+1] = self.yhalls()
-                else:
-                    rows[j*2+2][i*2+1] = self.xwalls()
+        rows = list(self.draw_rows(cubic.exit_map(z), width))
 
         if self.margin:
             return [line[self.margin:-self.margin] for line in rows[self.margin:-self.margin]]
         else:
             return rows
+
+    def draw_rows(self, exit_rows, width):
+        """
+        Draw rows of blocks from rows of exit bits, `width` rooms wide, one row at a time.
+
+        Yields the top boundary, then two rows of blocks for each row of rooms.  No margin is
+        taken off, and `exit_rows` may be any iterable, so this works on a maze as it's generated.
+        """
+        # Top boundary
+        yield [self.xwalls() if i % 2 else self.junctions() for i in range(2*width+1)]
+
+        for exits_row in exit_rows:
+            # Rooms and halls, with the left boundary
+            rooms = [self.ywalls()]
+            # Walls and halls below, and the junctions between them
+            below = [self.junctions()]
+            for i in range(width):
+                exits = exits_row[i]
+                rooms.append(self.rooms())
+                rooms.append(self.xhalls() if exits & PLUS_X else self.ywalls())
+                below.append(self.yhalls() if exits & PLUS_Y else self.xwalls())
+                below.append(self.junctions())
+            yield rooms
+            yield below
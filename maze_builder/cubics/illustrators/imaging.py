@@ -1,10 +1,76 @@
 from .base import BlockIllustratorBase, LineIllustratorBase
+from maze_builder.cubics.cubic import PLUS_X, PLUS_Y
+from maze_builder.sewer import Choice, Selector
 from PIL import Image, ImageDraw
+import numpy
 import random
 import zipfile
 
 
-class ImageBlockIllustrator(BlockIllustratorBase):
+def choose_colors(selector, count, random_state):
+    """`count` colors picked by `selector`, as a (count, 3) array"""
+    if isinstance(selector, Choice) and not any(isinstance(choice, Selector) for choice in selector.choices):
+        colors, probabilities = selector.distribution()
+        palette = numpy.array(colors, dtype=numpy.uint8).reshape(len(colors), 3)
+        if len(colors) == 1:
+            return numpy.broadcast_to(palette, (count, 3))
+        return palette[random_state.choice(len(colors), size=count, p=probabilities)]
+    else:
+        return numpy.array([selector() for _ in range(count)], dtype=numpy.uint8).reshape(count, 3)
+
+
+class ImageBlockIllustratorBase(BlockIllustratorBase):
+    """
+    Block illustrator drawing straight into an RGB array, a whole layer of exit bits at a time.
+    """
+    def draw_array(self, exits, random_state=None):
+        """
+        Draw a (height, width) array of exit bits as a (2*height+1, 2*width+1, 3) array of colors.
+        """
+        if random_state is None:
+            random_state = numpy.random.RandomState(random.getrandbits(32))
+        height, width = exits.shape
+        pixels = numpy.empty((2*height+1, 2*width+1, 3), dtype=numpy.uint8)
+
+        # Junctions everywhere, rooms, and the boundaries left & top
+        pixels[0::2, 0::2] = choose_colors(self.junctions, (height+1) * (width+1), random_state).reshape(height+1, width+1, 3)
+        pixels[1::2, 1::2] = choose_colors(self.rooms, height * width, random_state).reshape(height, width, 3)
+        pixels[0, 1::2] = choose_colors(self.xwalls, width, random_state)
+        pixels[1::2, 0] = choose_colors(self.ywalls, height, random_state)
+
+        # Halls or walls to the right of and below each room
+        self._draw_passages(pixels[1::2, 2::2], exits & PLUS_X != 0, self.xhalls, self.ywalls, random_state)
+        self._draw_passages(pixels[2::2, 1::2], exits & PLUS_Y != 0, self.yhalls, self.xwalls, random_state)
+        return pixels
+
+    def draw_image(self, cubic):
+        if cubic.maxz != cubic.minz:
+            raise RuntimeError('I can only draw 2D images')
+        width = 1 + cubic.maxx - cubic.minx
+        height = 1 + cubic.maxy - cubic.miny
+        exits = numpy.frombuffer(b''.join(cubic.exit_map(cubic.minz)), dtype=numpy.uint8).reshape(height, width)
+
+        pixels = self.draw_array(exits)
+        if self.margin:
+            pixels = numpy.ascontiguousarray(pixels[self.margin:-self.margin, self.margin:-self.margin])
+        return Image.frombuffer('RGB', (pixels.shape[1], pixels.shape[0]), pixels, 'raw', 'RGB', 0, 1)
+
+    def draw_scanlines(self, exit_rows, width):
+        """RGB scanlines, as bytes, for an iterable of rows of exit bits; see `draw_rows`"""
+        top = True
+        for row in exit_rows:
+            pixels = self.draw_array(numpy.frombuffer(bytes(row), dtype=numpy.uint8).reshape(1, width))
+            for line in (pixels if top else pixels[1:]):
+                yield line.tobytes()
+            top = False
+
+    @staticmethod
+    def _draw_passages(blocks, passages, halls, walls, random_state):
+        blocks[passages] = choose_colors(halls, int(passages.sum()), random_state)
+        blocks[~passages] = choose_colors(walls, int((~passages).sum()), random_state)
+
+
+class ImageBlockIllustrator(ImageBlockIllustratorBase):
     def __init__(self, wall_colors=[(0,0,0)], hall_colors=[(255,255,255)]):
         super().__init__(wall_colors, hall_colors)
 
@@ -12,13 +78,10 @@ class ImageBlockIllustrator(BlockIllustratorBase):
         return self.draw(cubic)
 
     def draw(self, cubic):
-        data = super().draw(cubic)
-        image = Image.new('RGB', (len(data[0]), len(data)))
-        image.putdata(sum(data, []))
-        return image
+        return self.draw_image(cubic)
 
 
-class ImageBlockIllustratorZoomed(BlockIllustratorBase):
+class ImageBlockIllustratorZoomed(ImageBlockIllustratorBase):
     def __init__(self, wall_colors=[(0,0,0)], hall_colors=[(255,255,255)], zoom=None, tilt=None, size=None):
         super().__init__(wall_colors, hall_colors, margin=1)
         self.zoom = zoom
@@ -32,11 +95,9 @@ class ImageBlockIllustratorZoomed(BlockIllustratorBase):
         zoom = self.zoom if self.zoom else random.choice([1, 2, 3, 5, 8, 13, 21, 34, 55])
         tilt = self.tilt if self.tilt else random.random() * 360
 
-        data = super().draw(cubic)
-        W, H = len(data[0]), len(data)
+        image = self.draw_image(cubic)
+        W, H = image.size
         size = self.size or (W, H)
-        image = Image.new('RGB', (W, H))
-        image.putdata(sum(data, []))
 
         m = min(W, H)
         M = max(W, H)
@@ -1,10 +1,15 @@
-from maze_builder.meshes.mesh import MeshBuilder, MeshTransformation, MeshWarp
+from maze_builder.meshes.mesh import MeshBuilder, ArrayMeshBuilder, MeshTransformation, MeshWarp
 from maze_builder.meshes.scene import *
 from maze_builder.meshes.yafaray import dump_yafaray
 from maze_builder.meshes.obj import dump_obj
+from maze_builder.meshes.ply import dump_ply
+from maze_builder.meshes.simplify import simplify_mesh
+from maze_builder.meshes import perlin
 from maze_builder import random2
 from .template import resource
+from maze_builder.cubics.cubic import MINUS_X, MINUS_Y
 import random
+import numpy
 from maze_builder.util import timed, is_verbose
 
 import io
@@ -16,14 +21,27 @@ YAFARAY_FILENAME = 'out.yafaray.xml'
 OBJ_FILENAME = 'out.obj'
 
 
+PLY_FILENAME = 'out.ply'
+
+
+# Corners of a room named as in `Mesher2D._draw_room`, as (x, y, z) offsets in its lattice
+LATTICE_CORNERS = {
+    name: numpy.array((k % 3, k // 3, z))
+    for z, names in enumerate(('abcdefghi', 'ABCDEFGHI'))
+    for k, name in enumerate(names)
+}
+
+
 class Mesher2D(object):
     def __init__(
         self,
         wall=0.1,
         material=None, density=1, enclosed=False,
+        mesh_class=ArrayMeshBuilder,
         **attrs
     ):
         self.wall = wall
+        self.mesh_class = mesh_class
         self.material = material
         self.density = density
         self.enclosed = enclosed
@@ -36,10 +54,14 @@ class Mesher2D(object):
 
     def draw(self, cubic):
         with timed(is_verbose(1), 'Meshing maze...', 'Maze generated in {0:.3f}s'):
-            mesh = MeshBuilder(**self.attrs)
+            mesh = self.mesh_class(**self.attrs)
 
             wall = self.wall() if callable(self.wall) else self.wall
 
+            if hasattr(mesh, 'enter_arrays'):
+                self._draw_lattice(cubic, mesh, wall)
+                return mesh
+
             for room in cubic.rooms:
                 self._draw_room(cubic, mesh, room, wall)
 
@@ -47,7 +69,7 @@ class Mesher2D(object):
                 x = cubic.minx + i
                 self._draw_room(cubic, mesh, (x, cubic.maxy+1, cubic.minz), wall)
 
-            for j in range(int(cubic.maxx - cubic.minx) + 1):
+            for j in range(int(cubic.maxy - cubic.miny) + 1):
                 y = cubic.miny + j
                 self._draw_room(cubic, mesh, (cubic.maxx+1, y, cubic.minz), wall)
 
@@ -55,11 +77,91 @@ class Mesher2D(object):
 
             return mesh
 
+    def _draw_lattice(self, cubic, mesh, wall):
+        """
+        Same faces as `_draw_room` gives every room, but all at once: each corner is picked from a
+        lattice of every corner in the maze, with rectangles chosen by the rooms' exits alone.
+        """
+        if cubic.minz != cubic.maxz:
+            raise RuntimeError('Illustrator only works for 2D')
+        density = self.density
+
+        # Rooms, plus a border row & column beyond the last
+        nx = int(cubic.maxx - cubic.minx) + 2
+        ny = int(cubic.maxy - cubic.miny) + 2
+        exits = numpy.zeros((ny, nx), dtype=numpy.uint8)
+        exits[:-1, :-1] = [list(row) for row in cubic.exit_map()]
+        present = numpy.ones((ny, nx), dtype=bool)
+        if len(cubic.rooms) < (nx - 1) * (ny - 1):
+            present[:-1, :-1] = False
+            for x, y, _ in cubic.rooms:
+                present[y - cubic.miny, x - cubic.minx] = True
+
+        j, i = numpy.mgrid[0:ny, 0:nx]
+        xtop, ytop = i == nx - 1, j == ny - 1
+        passage_x = ~xtop & (exits & MINUS_X != 0)
+        passage_y = ~ytop & (exits & MINUS_Y != 0)
+        wall_x = ~passage_x & ~ytop
+        wall_y = ~passage_y & ~xtop
+        rectangles = [
+            ('ABD', present),
+            ('efh', ~xtop & ~ytop),
+            ('BbE', xtop), ('aAd', ~xtop & (i == 0)),
+            ('DEd', passage_x), ('deg', passage_x), ('ghG', passage_x),
+            ('dDg', wall_x), ('DEG', wall_x), ('EeH', wall_x),
+            ('DEd', ytop), ('abA', ~ytop & (j == 0)),
+            ('BbE', passage_y), ('bce', passage_y), ('cCf', passage_y),
+            ('bcB', wall_y), ('BCE', wall_y), ('EFe', wall_y),
+        ]
+
+        # Lattice of corners: along x & y, each room has its corner, the wall's far side, then the
+        # next room; each gap is split `density` times, like `rectangle` does
+        def axis(start, rooms):
+            k = numpy.arange(2 * rooms + 2)
+            coarse = start + k // 2 + numpy.where(k % 2, wall, 0)
+            n = numpy.arange(2 * rooms * density + 1)
+            segment, t = n // density, n % density
+            return coarse[segment] + (t / density) * (coarse[segment + 1] - coarse[segment])
+
+        xs = axis(cubic.minx, nx)
+        ys = axis(cubic.miny, ny)
+        zs = cubic.minz + numpy.arange(density + 1) / density
+        shape = numpy.array([len(xs), len(ys), len(zs)])
+
+        steps = numpy.arange(density)
+        faces = list()
+        for corners, mask in rectangles:
+            rooms = numpy.nonzero(mask & present)
+            if not len(rooms[0]):
+                continue
+            room = numpy.stack([2 * rooms[1], 2 * rooms[0], numpy.zeros_like(rooms[0])], axis=-1)
+            origin, u, v = ((room + LATTICE_CORNERS[corner]) * density for corner in corners)
+            # Steps along each side, and the d x d grid of cells from `rectangle`, indexed (room, i, j)
+            su = ((u - origin) // density)[:, None, None, :]
+            sv = ((v - origin) // density)[:, None, None, :]
+            p00 = origin[:, None, None, :] + steps[:, None, None] * su + steps[None, :, None] * sv
+            p10, p01, p11 = p00 + su, p00 + sv, p00 + su + sv
+            triangles = numpy.stack([
+                numpy.stack([p00, p10, p01], axis=-2),
+                numpy.stack([p10, p11, p01], axis=-2),
+            ], axis=-3)
+            faces.append(triangles.reshape(-1, 3, 3))
+
+        # Number just the corners which are used
+        faces = numpy.concatenate(faces)
+        lattice_indices = (faces[..., 2] * shape[1] + faces[..., 1]) * shape[0] + faces[..., 0]
+        used, faces = numpy.unique(lattice_indices, return_inverse=True)
+        x = used % shape[0]
+        y = used // shape[0] % shape[1]
+        z = used // (shape[0] * shape[1])
+        mesh.enter_arrays(numpy.stack([xs[x], ys[y], zs[z]], axis=-1), faces.reshape(-1, 3))
+
     def _draw_room(self, cubic, mesh, coords, wall):
         x, y, z = coords
         if z != cubic.maxz:
             raise RuntimeError('Illustrator only works for 2D')
 
+        exits = cubic.exit_bits(coords)
         xbot = x == cubic.minx
         ybot = y == cubic.miny
         xtop = x == cubic.maxx+1
@@ -104,7 +206,7 @@ class Mesher2D(object):
             mesh.rectangle((vB, vb, vE), **kwargs)
         elif xbot:
             mesh.rectangle((va, vA, vd), **kwargs)
-        if not xtop and cubic.any_active_route_connecting((x, y, z), (x-1, y, z)):
+        if not xtop and exits & MINUS_X:
             # Draw corridor in -X direction
             mesh.rectangle((vD, vE, vd), **kwargs)
             mesh.rectangle((vd, ve, vg), **kwargs)
@@ -119,7 +221,7 @@ class Mesher2D(object):
             mesh.rectangle((vD, vE, vd), **kwargs)
         elif ybot:
             mesh.rectangle((va, vb, vA), **kwargs)
-        if not ytop and cubic.any_active_route_connecting((x, y, z), (x, y-1, z)):
+        if not ytop and exits & MINUS_Y:
             # Draw corridor in -Y direction
             mesh.rectangle((vB, vb, vE), **kwargs)
             mesh.rectangle((vb, vc, ve), **kwargs)
@@ -132,12 +234,18 @@ class Mesher2D(object):
 
 
 class Warper2D(object):
-    def __init__(self, noise, args=(), scale=1, height=1, offset=(0, 0)):
+    """
+    Raise the mesh by a height field `noise(x, y, *args)`, evaluated over arrays of x & y at once
+    if it's `vectorized` (by default, if it's from `maze_builder.meshes.perlin`), or else a vertex
+    at a time, like `noise.pnoise2` needs.
+    """
+    def __init__(self, noise, args=(), scale=1, height=1, offset=(0, 0), vectorized=None):
         self.noise = noise
         self.args = args
         self.scale = scale
         self.height = height
         self.offset = offset
+        self.vectorized = noise in (perlin.pnoise2,) if vectorized is None else vectorized
 
     def __call__(self, mesh):
         with timed(is_verbose(1), 'Warping mesh...', 'Mesh warped in {0:.3f}s'):
@@ -146,16 +254,38 @@ class Warper2D(object):
             height = self.height() if callable(self.height) else self.height
             offx, offy = self.offset() if callable(self.offset) else self.offset
 
-            def warp(v):
-                x, y, z = v
-                z += height * scale * self.noise(offx + x / scale, offy + y / scale, *args)
-                return x, y, z
+            def warp(vertices):
+                xs = offx + vertices[:, 0] / scale
+                ys = offy + vertices[:, 1] / scale
+                if self.vectorized:
+                    heights = self.noise(xs, ys, *args)
+                else:
+                    heights = numpy.vectorize(lambda x, y: self.noise(x, y, *args), otypes=[float])(xs, ys)
+                vertices[:, 2] += height * scale * numpy.asarray(heights, dtype=float)
 
-            mesh.perform_warp(warp)
+            mesh.perform_array_warp(warp)
             mesh.update_attributes(smoothing_degrees=30)
             return mesh
 
 
+class MeshSimplifier(object):
+    """
+    Merge triangles while the surface moves by no more than `tolerance` (see
+    `maze_builder.meshes.simplify`): flat, subdivided floors & walls with none at all, and gently
+    warped ones nearly as well.
+    """
+    def __init__(self, tolerance=0.0):
+        self.tolerance = tolerance
+
+    def __call__(self, mesh):
+        with timed(is_verbose(1), 'Simplifying mesh...', 'Mesh simplified in {0:.3f}s'):
+            tolerance = self.tolerance() if callable(self.tolerance) else self.tolerance
+            simplified = simplify_mesh(mesh, tolerance)
+            if is_verbose(1):
+                print('Mesh simplified from {} to {} faces'.format(mesh.count_faces(), simplified.count_faces()))
+            return simplified
+
+
 class SceneWrapper(object):
     def __call__(self, mesh):
         scene = Scene()
@@ -188,8 +318,9 @@ class RandomCameraPlacer(object):
         radius = 1 + random.random() * min((maxx-minx, maxy-miny)) * self.distance_scale
         camera_location = random2.hemisphere(radius, minz=1)
 
-        _, maxz = mesh.find_limits(
-            (0, 0, 1),
+        # Heights over small windows, from a grid rather than every vertex
+        grid = mesh.height_grid()
+        _, maxz = grid.find_limits(
             xbounds=(
                 max((minx+1, camera_location[0]-1)),
                 min((maxx-1, camera_location[0]+1)),
@@ -202,7 +333,7 @@ class RandomCameraPlacer(object):
         print('Camera limit {}'.format(maxz))
         if maxz > -float('inf'):
             camera_location = (camera_location[0], camera_location[1], camera_location[2] + maxz)
-        cminz, cmaxz = mesh.find_limits((0, 0, 1), xbounds=(-1, 1), ybounds=(-1, 1))
+        cminz, cmaxz = grid.find_limits(xbounds=(-1, 1), ybounds=(-1, 1))
         look_at = (0, 0, random.random() * (cminz + cmaxz)/2)
 
         scene.set_camera(Camera(camera_location, look_at, resolution=self.resolution))
@@ -222,6 +353,18 @@ class ObjSaver(object):
         return self.filename
 
 
+class PlySaver(object):
+    def __init__(self, filename=PLY_FILENAME):
+        self.filename = filename
+
+    def __call__(self, mesh):
+        if isinstance(mesh, Scene):
+            mesh = mesh.meshes[0]
+        with timed(is_verbose(1), 'Saving mesh to PLY format...', 'Mesh saved in {0:.3f}s'):
+            dump_ply(self.filename, mesh)
+        return self.filename
+
+
 class YafaraySaver(object):
     def __init__(self, filename=YAFARAY_FILENAME, material_map=None, xml='simple.yafaray.xml'):
         self.filename = filename
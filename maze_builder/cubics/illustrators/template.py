@@ -1,17 +1,48 @@
+import collections
+import functools
 import pkgutil
-import jinja2
 import random
+from maze_builder import templates
 
 
 RESOURCE_PACKAGE = 'maze_builder.cubics.resources'
 
 
+@functools.lru_cache(maxsize=None)
 def resource(resource_name):
     return pkgutil.get_data(RESOURCE_PACKAGE, resource_name).decode('utf-8')
 
 
 def template(template_name, **kwargs):
-    return jinja2.Template(resource(template_name)).render(**kwargs)
+    return templates.render(RESOURCE_PACKAGE, template_name, **kwargs)
+
+
+def wall_spans(walls):
+    """
+    Merge walls between rooms side by side in x or y into runs lying end to end.  Yields `(xd, yd,
+    xc, yc)` for each, as a single wall would give: its length across x or y, and its center.
+    """
+    lines = collections.defaultdict(list)
+    for wall in walls:
+        (x0, y0, z0), (x1, y1, z1) = sorted((room.x, room.y, room.z) for room in wall.rooms)
+        if (x1 - x0, y1 - y0, z1 - z0) == (1, 0, 0):
+            lines['x', x0, z0].append(y0)
+        elif (x1 - x0, y1 - y0, z1 - z0) == (0, 1, 0):
+            lines['y', y0, z0].append(x0)
+        else:
+            yield x1 - x0, y1 - y0, (x1 + x0)/2, (y1 + y0)/2
+
+    for (dim, line, _), positions in sorted(lines.items()):
+        positions.sort()
+        start = 0
+        for i in range(1, len(positions) + 1):
+            if i == len(positions) or positions[i] != positions[i-1] + 1:
+                length, center = i - start, positions[start] + (i - start - 1)/2
+                if dim == 'x':
+                    yield length, 0, line + 1/2, center
+                else:
+                    yield 0, length, center, line + 1/2
+                start = i
 
 
 class CubicTemplateIllustrator(object):
@@ -23,6 +54,20 @@ class CubicTemplateIllustrator(object):
             self.template,
             connections=cubic.topology.active_routes,
             walls=cubic.topology.inactive_routes(),
+            wall_spans=wall_spans(cubic.topology.inactive_routes()),
+            center=cubic.center(),
+            seed=random.randint(1, 30000),
+        )
+
+    def dump(self, cubic, fp):
+        """Like `draw`, but rendering a chunk at a time straight into the file `fp`"""
+        templates.dump(
+            fp,
+            RESOURCE_PACKAGE,
+            self.template,
+            connections=cubic.topology.active_routes,
+            walls=cubic.topology.inactive_routes(),
+            wall_spans=wall_spans(cubic.topology.inactive_routes()),
             center=cubic.center(),
             seed=random.randint(1, 30000),
         )
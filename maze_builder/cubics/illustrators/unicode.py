@@ -1,4 +1,5 @@
-from .base import BlockIllustratorBase
+from .base import BlockIllustratorBase, exits_at
+from maze_builder.cubics.cubic import MINUS_X, MINUS_Y
 from maze_builder.random2 import weighted_choice
 from maze_builder.emoji import FEATURE_SETS
 import random
@@ -37,31 +38,26 @@ class UnicodeWallIllustrator(object):
     def draw(self, cubic):
         width = 1 + cubic.maxx - cubic.minx
         height = 1 + cubic.maxy - cubic.miny
-        ox = cubic.minx
-        oy = cubic.miny
         z = cubic.maxz
         if cubic.maxz != cubic.minz:
             raise RuntimeError('I can only draw 2D images')
+        exit_map = cubic.exit_map(z)
         lines = [[self.walls[0]] * (width+1) for _ in range(height+1)]
 
         for j in range(0, height+1):
-            y = oy + j
             for i in range(0, width+1):
-                x = ox + i
-
                 val = 0
-                if i < width and not cubic.any_active_route_connecting((x, y-1, z), (x, y, z)):
+                if i < width and not exits_at(exit_map, i, j) & MINUS_Y:
                     val += 1
-                if j < height and not cubic.any_active_route_connecting((x-1, y, z), (x, y, z)):
+                if j < height and not exits_at(exit_map, i, j) & MINUS_X:
                     val += 2
-                if i > 0 and not cubic.any_active_route_connecting((x-1, y-1, z), (x-1, y, z)):
+                if i > 0 and not exits_at(exit_map, i-1, j) & MINUS_Y:
                     val += 4
-                if j > 0 and not cubic.any_active_route_connecting((x-1, y-1, z), (x, y-1, z)):
+                if j > 0 and not exits_at(exit_map, i, j-1) & MINUS_X:
                     val += 8
 
                 lines[j][i] = self.walls[val]
 
-        print(self.margin)
         return self.newline.join(
             self.charsep.join(line)
             for line in lines
@@ -88,22 +84,18 @@ class UnicodeQuarterBlockIllustrator(object):
     def draw(self, cubic):
         width = 1 + cubic.maxx - cubic.minx
         height = 1 + cubic.maxy - cubic.miny
-        ox = cubic.minx
-        oy = cubic.miny
         z = cubic.maxz
         if cubic.maxz != cubic.minz:
             raise RuntimeError('I can only draw 2D images')
+        exit_map = cubic.exit_map(z)
         lines = [[self.blocks[0]] * (width+1) for _ in range(height+1)]
 
         for j in range(0, height+1):
-            y = oy + j
             for i in range(0, width+1):
-                x = ox + i
-
                 val = 0
-                if i >= width or cubic.any_active_route_connecting((x, y-1, z), (x, y, z)):
+                if i >= width or exits_at(exit_map, i, j) & MINUS_Y:
                     val += 2
-                if j >= height or cubic.any_active_route_connecting((x-1, y, z), (x, y, z)):
+                if j >= height or exits_at(exit_map, i, j) & MINUS_X:
                     val += 1
 
                 lines[j][i] = self.blocks[val]
@@ -0,0 +1,113 @@
+"""
+Maze generation over whole rectangular grids at once, using NumPy edge arrays.
+
+Rooms are numbered like `DenseCubic` rooms, x varying fastest, so arrays here reshape to
+(z, y, x).  Exits use the same bits as `cubic.DIRECTIONS`.
+"""
+import numpy
+import random
+
+
+def _index_type(count):
+    return numpy.int32 if count < 2**31 else numpy.int64
+
+
+def grid_edges(shape):
+    """
+    Every pair of neighboring rooms of a (z, y, x) grid, as arrays of lower room index & direction.
+    """
+    count = int(numpy.prod(shape))
+    indices = numpy.arange(count, dtype=_index_type(count)).reshape(shape)
+    lower = (
+        indices[:, :, :-1].ravel(),
+        indices[:, :-1, :].ravel(),
+        indices[:-1, :, :].ravel(),
+    )
+    rooms = numpy.concatenate(lower)
+    directions = numpy.concatenate([
+        numpy.full(len(rooms), direction, dtype=numpy.uint8)
+        for direction, rooms in enumerate(lower)
+    ])
+    return rooms, directions
+
+
+def grid_strides(shape):
+    return numpy.array([1, shape[2], shape[2] * shape[1]], dtype=_index_type(numpy.prod(shape)))
+
+
+def flatten_labels(parents):
+    """Root of every element of a union-find `parents` array, found by pointer jumping"""
+    labels = numpy.array(parents, dtype=_index_type(len(parents)))
+    while True:
+        jumped = labels[labels]
+        if numpy.array_equal(jumped, labels):
+            return labels
+        labels = jumped
+
+
+def compact_labels(parents):
+    """Like `flatten_labels`, but renumbers the roots 0, 1, 2...; returns labels & root count"""
+    roots = flatten_labels(parents)
+    is_root = roots == numpy.arange(len(roots), dtype=roots.dtype)
+    numbers = numpy.cumsum(is_root, dtype=roots.dtype) - 1
+    return numbers[roots], int(numbers[-1]) + 1 if len(numbers) else 0
+
+
+def spanning_tree(shape, labels=None, random_state=None):
+    """
+    Random spanning tree of a (z, y, x) grid, as exit bits per room.
+
+    This is the same tree random Kruskal finds: edges are ranked by a random permutation and the
+    minimum spanning tree for those ranks is built, here with Borůvka's algorithm so that each
+    round is a handful of array operations.  `labels` (default: every room on its own) is a
+    union-find parent array giving the space each room is already in; spaces are never joined twice.
+
+    Returns the exit bits as a flat `uint8` array, and the final label of each room.
+    """
+    if random_state is None:
+        random_state = numpy.random.RandomState(random.getrandbits(32))
+    count = int(numpy.prod(shape))
+    if labels is None:
+        labels, spaces = numpy.arange(count, dtype=_index_type(count)), count
+    else:
+        labels, spaces = compact_labels(labels)
+
+    rooms, directions = grid_edges(shape)
+    order = random_state.permutation(len(rooms))
+    rooms, directions = rooms[order], directions[order]
+    others = rooms + grid_strides(shape)[directions]
+
+    # Edges are kept in rank order, tracking the space at each end
+    tree = numpy.zeros(len(rooms), dtype=bool)
+    ranks = numpy.arange(len(rooms), dtype=_index_type(len(rooms)))
+    lower, upper = labels[rooms], labels[others]
+    while True:
+        external = lower != upper
+        if not external.all():
+            ranks, lower, upper = ranks[external], lower[external], upper[external]
+        if not len(ranks):
+            break
+
+        # Cheapest edge out of each space is the first one to mention it
+        first = numpy.full(spaces, len(ranks), dtype=ranks.dtype)
+        positions = numpy.arange(len(ranks), dtype=ranks.dtype)
+        numpy.minimum.at(first, lower, positions)
+        numpy.minimum.at(first, upper, positions)
+        chosen = first[first < len(ranks)]
+        tree[ranks[chosen]] = True
+
+        # Hook every space onto the space across its cheapest edge, except that of each pair which
+        # chose each other, the smaller stays a root.  (Every space has an edge out, or we'd be done.)
+        here = numpy.arange(spaces, dtype=lower.dtype)
+        parents = numpy.where(lower[first] == here, upper[first], lower[first])
+        mutual = (parents[parents] == here) & (here < parents)
+        parents[mutual] = here[mutual]
+        mapping, spaces = compact_labels(parents)
+        lower, upper, labels = mapping[lower], mapping[upper], mapping[labels]
+
+    exits = numpy.zeros(count, dtype=numpy.uint8)
+    for direction in range(3):
+        selected = tree & (directions == direction)
+        exits[rooms[selected]] |= 1 << direction
+        exits[others[selected]] |= 1 << (direction + 3)
+    return exits, labels
@@ -1,13 +1,14 @@
 import argparse
 import os.path
-from .processor import Processor, PipelineBuilder
 import sys
 from collections import namedtuple
 import shutil
 import random
 import math
-import noise
-from .sewer import Choice
+import functools
+import warnings
+from .sewer import Choice, Selector
+from .util import clock, import_times, print_import_times
 
 
 POVRAY_INI = 'povray.ini'
@@ -18,9 +19,12 @@ Settings = namedtuple(
     ['config', 'verbose', 'keys',
      'pov', 'ini', 'include_path',
      'magick',
-     'builder', 'tweet', 'autofollow',
+     'builder', 'algorithm', 'tweet', 'autofollow',
      'yafaray', 'yafaray_plugins',
      'emojis',
+     'count', 'out_dir', 'workers', 'render_jobs', 'strips',
+     'simplify',
+     'profile_startup',
      ]
 )
 
@@ -32,20 +36,27 @@ DEFAULTS = Settings(
     pov=None,
     ini=None,
     include_path=None,
-    magick=None,
+    magick=None,  # Deprecated, images are converted with PIL
     builder=Choice.DEFAULT,
+    algorithm=None,
     tweet=False,  # Misleading, change this
     autofollow=False,
     yafaray=None,
     yafaray_plugins=None,
     emojis=None,
+    count=1,
+    out_dir=None,
+    workers=1,
+    render_jobs=1,
+    strips=1,
+    simplify=None,
+    profile_startup=False,
 )
 
 
 # Default executables, used only if we detect their presence.
 PROG_DEFAULTS = dict(
     pov='povray',
-    magick='convert',
 )
 
 
@@ -80,12 +91,16 @@ parser.add_argument(
 )
 parser.add_argument(
     '--magick', '-M', type=str,
-    help='ImageMagick command line tool',
+    help='Deprecated and ignored: images are converted with PIL',
 )
 parser.add_argument(
     '--builder', '-b', type=str, default=Choice.DEFAULT,
     help='Force particular builder to be used',
 )
+parser.add_argument(
+    '--algorithm', '-a', type=str, default=None,
+    help='Maze generation algorithm from maze_builder.mazes.algorithms (default: each maze\'s own)',
+)
 parser.add_argument(
     '--yafaray', '-Y', type=str,
     help='Yafaray executable',
@@ -103,6 +118,39 @@ parser.add_argument(
     help='Auto-follow my followers',
 )
 
+parser.add_argument(
+    '--count', '-n', type=int, default=1,
+    help='Number of mazes to build, each into its own numbered directory under --out-dir',
+)
+parser.add_argument(
+    '--out-dir', '-o', type=str, default=None,
+    help='Directory for numbered outputs (default: current directory if building more than one)',
+)
+parser.add_argument(
+    '--workers', '-j', type=int, default=1,
+    help='Number of processes to build a batch of mazes with',
+)
+
+parser.add_argument(
+    '--render-jobs', '-R', type=int, default=1,
+    help='Number of renderer (POV-Ray/Yafaray) processes to run at once, in the background',
+)
+parser.add_argument(
+    '--strips', '-S', type=int, default=1,
+    help='Split each POV-Ray frame into this many horizontal strips rendered at once, then stitched',
+)
+
+parser.add_argument(
+    '--simplify', type=float, default=None,
+    help='Simplify meshes to within this tolerance before rendering or export (default: off)',
+)
+
+parser.add_argument(
+    '--profile-startup',
+    action='store_true', default=False,
+    help='Report the time taken to import each module',
+)
+
 
 def _find_config(filename):
     if os.path.exists(filename):
@@ -113,13 +161,195 @@ def _find_config(filename):
     return None
 
 
+def _absolute_paths(paths):
+    """Make comma-separated `paths` absolute, so they survive changing directory"""
+    return ','.join(os.path.abspath(path.strip()) for path in paths.split(','))
+
+
+def _warn_deprecated(args):
+    if args.magick:
+        warnings.warn('--magick is deprecated and ignored: images are converted with PIL', stacklevel=2)
+
+
 def make_defaults():
     return DEFAULTS._replace(**{
         arg: prog for arg, prog in PROG_DEFAULTS.items() if shutil.which(prog)
     })
 
 
+def _lost_text():
+    from maze_builder.lost_text.writers import LostTextWriter
+    return LostTextWriter().write()
+
+
+def _castle(template):
+    from maze_builder.castles.builder import CastleBuilder
+    from maze_builder.castles.illustrators import TemplateIllustrator
+    return CastleBuilder(TemplateIllustrator(template))
+
+
+def _bw2d(tilt=False, algorithm=None):
+    from maze_builder.cubics.builders import ImageBuilder
+    from maze_builder.cubics.illustrators.imaging import ImageBlockIllustrator, ImageBlockIllustratorZoomed
+    return ImageBuilder(
+        506, 253, illustrator=ImageBlockIllustratorZoomed() if tilt else ImageBlockIllustrator(), algorithm=algorithm)
+
+
+def _poster2d():
+    from maze_builder.cubics.builders import StreamingImageBuilder
+    return StreamingImageBuilder(1001, 20001)
+
+
+def _colors2d(algorithm=None):
+    from maze_builder.cubics.builders import ImageBuilderCombined
+    from maze_builder.cubics.illustrators.imaging import ImageBlockIllustratorZoomed
+    return ImageBuilderCombined(512, 512, (
+        ImageBlockIllustratorZoomed(hall_colors=[(255,0,0)], size=(506, 253)),
+        ImageBlockIllustratorZoomed(hall_colors=[(0,255,0)], size=(506, 253)),
+        ImageBlockIllustratorZoomed(hall_colors=[(0,0,255)], size=(506, 253)),
+    ), 'add', algorithm=algorithm)
+
+
+def _pastels2d(algorithm=None):
+    from maze_builder.cubics.builders import ImageBuilderCombined
+    from maze_builder.cubics.illustrators.imaging import ImageBlockIllustratorZoomed
+    return ImageBuilderCombined(512, 512, (
+        ImageBlockIllustratorZoomed(wall_colors=[tuple(int(256*(1-random.random()**2)) for _ in range(3))], size=(506, 253)),
+        ImageBlockIllustratorZoomed(wall_colors=[tuple(int(256*(1-random.random()**2)) for _ in range(3))], size=(506, 253)),
+        ImageBlockIllustratorZoomed(wall_colors=[tuple(int(256*(1-random.random()**2)) for _ in range(3))], size=(506, 253)),
+    ), 'multiply', algorithm=algorithm)
+
+
+def _cubic_pov(template, *size, algorithm=None):
+    from maze_builder.cubics.builders import CubicPovBuilder
+    from maze_builder.cubics.illustrators.template import CubicTemplateIllustrator
+    return CubicPovBuilder(CubicTemplateIllustrator(template), *size, algorithm=algorithm)
+
+
+def _seeded_pov(template):
+    from maze_builder.cubics.builders import SeededPovBuilder
+    from maze_builder.cubics.illustrators.template import CubicTemplateIllustrator
+    return SeededPovBuilder(CubicTemplateIllustrator(template))
+
+
+def _mazehill(algorithm=None, simplify=None):
+    from maze_builder.processor import PipelineBuilder
+    from maze_builder.meshes import perlin
+    from maze_builder.cubics.builders import FilledCubicGenerator
+    from maze_builder.cubics.illustrators.mesh import (
+        Mesher2D, Warper2D, MeshSimplifier, SceneWrapper, RandomCameraPlacer, RandomSunMaker, YafaraySaver
+    )
+    noise_x = 1000 * random.random()
+    noise_y = 1000 * random.random()
+    return PipelineBuilder(
+        FilledCubicGenerator(70, algorithm=algorithm),
+        Mesher2D(wall=random.random, density=2),
+        Choice({
+            Warper2D(
+                perlin.pnoise2,
+                (3,),
+                (lambda: 40 * random.random()),
+                (lambda: random.random() ** 2.5),
+                (noise_x, noise_y)
+            ): 10,
+            (lambda mesh: mesh): 1,
+        }),
+        MeshSimplifier(simplify) if simplify is not None else (lambda mesh: mesh),
+        SceneWrapper(),
+        RandomSunMaker(),
+        RandomCameraPlacer((1024, 512)),
+        YafaraySaver(),
+        'process_yafaray'
+    )
+
+
+def _objtest(saver='obj', algorithm=None, simplify=None):
+    from maze_builder.processor import PipelineBuilder
+    from maze_builder.meshes import perlin
+    from maze_builder.cubics.builders import FilledCubicGenerator
+    from maze_builder.cubics.illustrators.mesh import Mesher2D, Warper2D, MeshSimplifier, ObjSaver, PlySaver
+    noise_amount = 2
+    noise_scale = 2**noise_amount
+    noise_x = 1000 * random.random()
+    noise_y = 1000 * random.random()
+    return PipelineBuilder(
+        FilledCubicGenerator(20, algorithm=algorithm),
+        Mesher2D(wall=0.5),
+        Choice({
+            Warper2D(perlin.pnoise2, (noise_amount,), noise_scale/5, 5, (noise_x, noise_y)): 1,
+            (lambda mesh: mesh): 0,
+        }),
+        MeshSimplifier(simplify) if simplify is not None else (lambda mesh: mesh),
+        PlySaver() if saver == 'ply' else ObjSaver(),
+        'process_{}'.format(saver)
+    )
+
+
+def _emojis(emojis, algorithm=None):
+    from maze_builder.processor import PipelineBuilder
+    from maze_builder.cubics.builders import FilledCubicGenerator, ImageSaver
+    from maze_builder.cubics.illustrators.imaging import ImageLineIllustrator
+    return PipelineBuilder(
+        FilledCubicGenerator(50, 25, features=Choice({
+            tuple([(random.randrange(3, 15),)
+              for _ in range(random.randrange(15))]): 10,
+            tuple([(7,)] * random.randrange(15)): 5,
+        }), algorithm=algorithm),
+        ImageLineIllustrator(
+            8, 2,
+            features=emojis),
+        ImageSaver(),
+        'tweet_image'
+    )
+
+
+def make_builders(args):
+    """
+    Every builder by name, as selectors which import & make the builder only when it's chosen.
+    Those generating a maze of rooms fill it with `args.algorithm`, if any, and those making meshes
+    simplify them to within `args.simplify`, if given.
+    """
+    generated = {
+        'bw2d': _bw2d,
+        'bw2dtilt': functools.partial(_bw2d, tilt=True),
+        'colors2d': _colors2d,
+        'pastels2d': _pastels2d,
+        'boulders': functools.partial(_cubic_pov, 'boulders.pov.jinja2', 50),
+        'simple3d': functools.partial(_cubic_pov, 'simple.pov.jinja2', 50),
+        'borg': functools.partial(_cubic_pov, 'borg.pov.jinja2', 8, 8, 8),
+        'mazehill': functools.partial(_mazehill, simplify=args.simplify),
+        'objtest': functools.partial(_objtest, simplify=args.simplify),
+        'plytest': functools.partial(_objtest, 'ply', simplify=args.simplify),
+        'emojis': functools.partial(_emojis, args.emojis),
+    }
+    lazy = {
+        'evil': functools.partial(_castle, 'evil.pov.jinja2'),
+        'fantasy': functools.partial(_castle, 'fantasy.pov.jinja2'),
+        'escher': functools.partial(_castle, 'escher.pov.jinja2'),
+        'brick': functools.partial(_castle, 'brick.pov.jinja2'),
+        'pure': functools.partial(_castle, 'pure.pov.jinja2'),
+        'poster2d': _poster2d,
+        'borg2': functools.partial(_seeded_pov, 'borg.pov.jinja2'),
+    }
+    lazy.update(
+        (name, functools.partial(factory, algorithm=args.algorithm)) for name, factory in generated.items())
+    return {Selector.bless(factory): name for name, factory in lazy.items()}
+
+
 def main(args=None):
+    knargs, _ = parser.parse_known_args()
+    if knargs.profile_startup or getattr(args, 'profile_startup', False):
+        started = clock()
+        with import_times() as times:
+            try:
+                return _main(args)
+            finally:
+                print_import_times(times, clock() - started)
+    else:
+        return _main(args)
+
+
+def _main(args=None):
     # Rigamarole of loading args from config (if any) & setting as defaults
     defaults = make_defaults()
 
@@ -146,101 +376,23 @@ def main(args=None):
         if executable and not shutil.which(executable):
             raise RuntimeError('Executable {} not found!'.format(executable))
 
-    # Make & run processor
+    _warn_deprecated(args)
 
-    from maze_builder.sewer import Choice
-    from maze_builder.castles.builder import CastleBuilder
-    from maze_builder.castles.illustrators import TemplateIllustrator
-    from maze_builder.cubics.builders import (
-        ImageBuilder, CubicPovBuilder, ImageBuilderCombined, SeededPovBuilder,
-        FilledCubicGenerator, ImageSaver
-    )
-    from maze_builder.cubics.illustrators.template import CubicTemplateIllustrator
-    from maze_builder.cubics.illustrators.imaging import (
-        ImageBlockIllustratorZoomed, ImageLineIllustrator
-    )
-    from maze_builder.cubics.illustrators.mesh import (
-        Mesher2D, Warper2D, SceneWrapper,
-        RandomCameraPlacer, RandomSunMaker, YafaraySaver, ObjSaver
-    )
-    from maze_builder.lost_text.writers import LostTextWriter
+    if args.algorithm:
+        from .mazes.algorithms import ALGORITHMS
+        if args.algorithm not in ALGORITHMS:
+            raise RuntimeError('No maze algorithm named {}, try one of {}'.format(args.algorithm, sorted(ALGORITHMS)))
 
-    builders = {
-        CastleBuilder(TemplateIllustrator('evil.pov.jinja2')): 'evil',
-        CastleBuilder(TemplateIllustrator('fantasy.pov.jinja2')): 'fantasy',
-        CastleBuilder(TemplateIllustrator('escher.pov.jinja2')): 'escher',
-        CastleBuilder(TemplateIllustrator('brick.pov.jinja2')): 'brick',
-        CastleBuilder(TemplateIllustrator('pure.pov.jinja2')): 'pure',
-        ImageBuilder(506, 253): 'bw2d',
-        ImageBuilder(506, 253, illustrator=ImageBlockIllustratorZoomed()): 'bw2dtilt',
-        ImageBuilderCombined(512, 512, (
-            ImageBlockIllustratorZoomed(hall_colors=[(255,0,0)], size=(506, 253)),
-            ImageBlockIllustratorZoomed(hall_colors=[(0,255,0)], size=(506, 253)),
-            ImageBlockIllustratorZoomed(hall_colors=[(0,0,255)], size=(506, 253)),
-        ), 'add'): 'colors2d',
-        ImageBuilderCombined(512, 512, (
-            ImageBlockIllustratorZoomed(wall_colors=[tuple(int(256*(1-random.random()**2)) for _ in range(3))], size=(506, 253)),
-            ImageBlockIllustratorZoomed(wall_colors=[tuple(int(256*(1-random.random()**2)) for _ in range(3))], size=(506, 253)),
-            ImageBlockIllustratorZoomed(wall_colors=[tuple(int(256*(1-random.random()**2)) for _ in range(3))], size=(506, 253)),
-        ), 'multiply'): 'pastels2d',
-        CubicPovBuilder(CubicTemplateIllustrator('boulders.pov.jinja2'), 50): 'boulders',
-        CubicPovBuilder(CubicTemplateIllustrator('simple.pov.jinja2'), 50): 'simple3d',
-        CubicPovBuilder(CubicTemplateIllustrator('borg.pov.jinja2'), 8, 8, 8): 'borg',
-        SeededPovBuilder(CubicTemplateIllustrator('borg.pov.jinja2')): 'borg2',
-    }
+    # Batches are built in numbered directories
+    if args.count > 1 or args.out_dir:
+        for arg in ('keys', 'ini', 'include_path', 'emojis'):
+            if getattr(args, arg):
+                setattr(args, arg, _absolute_paths(getattr(args, arg)))
 
-    noise_amount = 2
-    noise_scale = 2**noise_amount
-    noise_x = 1000 * random.random()
-    noise_y = 1000 * random.random()
+    # Make & run processor; builders are only imported & made once chosen
+    from .processor import Processor
 
-    builders.update({
-        PipelineBuilder(
-            FilledCubicGenerator(70),
-            Mesher2D(wall=random.random, density=2),
-            Choice({
-                Warper2D(
-                    noise.pnoise2,
-                    (3,),
-                    (lambda: 40 * random.random()),
-                    (lambda: random.random() ** 2.5),
-                    (noise_x, noise_y)
-                ): 10,
-                (lambda mesh: mesh): 1,
-            }),
-            SceneWrapper(),
-            RandomSunMaker(),
-            RandomCameraPlacer((1024, 512)),
-            YafaraySaver(),
-            'process_yafaray'
-        ): 'mazehill'
-    })
-    builders.update({
-        PipelineBuilder(
-            FilledCubicGenerator(20),
-            Mesher2D(wall=0.5),
-            Choice({
-                Warper2D(noise.pnoise2, (noise_amount,), noise_scale/5, 5, (noise_x, noise_y)): 1,
-                (lambda mesh: mesh): 0,
-            }),
-            ObjSaver(),
-            'process_obj'
-        ): 'objtest'
-    })
-    builders.update({
-        PipelineBuilder(
-            FilledCubicGenerator(50, 25, features=Choice({
-                tuple([(random.randrange(3, 15),)
-                  for _ in range(random.randrange(15))]): 10,
-                tuple([(7,)] * random.randrange(15)): 5,
-            })),
-            ImageLineIllustrator(
-                8, 2,
-                features=args.emojis),
-            ImageSaver(),
-            'tweet_image'
-        ): 'emojis'
-    })
+    builders = make_builders(args)
     weights = dict(
         evil=20,
         fantasy=32,
@@ -249,6 +401,7 @@ def main(args=None):
         pure=3,
         bw2d=2,
         bw2dtilt=2,
+        poster2d=0,
         colors2d=4,
         pastels2d=10,
         boulders=15,
@@ -257,11 +410,12 @@ def main(args=None):
         borg2=10,
         mazehill=30,
         objtest=0,
+        plytest=0,
         emojis=35,
     )
     processor = Processor(
         builders=Choice.of(builders).weighting(Choice.DEFAULT, weights),
-        default_status=LostTextWriter().write,
+        default_status=_lost_text,
         args=args
     )
 
@@ -0,0 +1,154 @@
+"""
+Maze generation algorithms, registered by name in `ALGORITHMS`.
+
+Each algorithm takes a maze laid out on a grid -- anything like `Cubic`, offering `rooms` (keyed by
+coords), `neighbors(coords)` and `connect(coords0, coords1)` -- and opens passages in it.  They're
+generators yielding each passage as it's opened, so the maze can be consumed while it grows; use
+`generate` to just run one to completion.
+"""
+from .equivalence import DisjointSets
+import itertools
+import random
+
+
+ALGORITHMS = dict()
+
+
+def register(name):
+    def register_algorithm(fun):
+        ALGORITHMS[name] = fun
+        return fun
+    return register_algorithm
+
+
+def generate(maze, algorithm='kruskal', **kwargs):
+    if algorithm not in ALGORITHMS:
+        raise KeyError('No maze algorithm named `{}`, try one of {}'.format(algorithm, sorted(ALGORITHMS)))
+    for _ in ALGORITHMS[algorithm](maze, **kwargs):
+        pass
+    return maze
+
+
+@register('kruskal')
+def kruskal(maze):
+    pairs = [
+        (coords, neighbor)
+        for coords in maze.rooms
+        for neighbor in maze.neighbors(coords)
+        if coords < neighbor
+    ]
+    random.shuffle(pairs)
+    for pair in pairs:
+        if maze.connect(*pair):
+            yield pair
+
+
+@register('wilson')
+def wilson(maze):
+    """Uniform spanning tree, built from loop-erased random walks"""
+    rooms = list(maze.rooms)
+    random.shuffle(rooms)
+    tree = set(rooms[:1])
+    for start in rooms:
+        walk = dict()
+        coords = start
+        while coords not in tree:
+            walk[coords] = random.choice(list(maze.neighbors(coords)))
+            coords = walk[coords]
+
+        # Retrace the walk; later steps out of a room overwrote its loops
+        coords = start
+        while coords not in tree:
+            tree.add(coords)
+            if maze.connect(coords, walk[coords]):
+                yield coords, walk[coords]
+            coords = walk[coords]
+
+
+@register('growing-tree')
+def growing_tree(maze, newest=0.5):
+    """
+    Grow from a list of active rooms, picking the newest with probability `newest`, else any.
+    """
+    start = random.choice(list(maze.rooms))
+    visited = {start}
+    active = [start]
+    while active:
+        i = len(active) - 1 if random.random() < newest else random.randrange(len(active))
+        coords = active[i]
+        options = [neighbor for neighbor in maze.neighbors(coords) if neighbor not in visited]
+        if options:
+            neighbor = random.choice(options)
+            visited.add(neighbor)
+            active.append(neighbor)
+            if maze.connect(coords, neighbor):
+                yield coords, neighbor
+        else:
+            active[i] = active[-1]
+            active.pop()
+
+
+@register('backtracker')
+def recursive_backtracker(maze):
+    return growing_tree(maze, newest=1)
+
+
+@register('eller')
+def eller(maze):
+    if maze.minz != maze.maxz:
+        raise RuntimeError('Eller\'s algorithm only works for 2D mazes')
+    z = maze.minz
+    width = 1 + maze.maxx - maze.minx
+    height = 1 + maze.maxy - maze.miny
+    for j, (east, south) in enumerate(eller_rows(width, height)):
+        y = maze.miny + j
+        for i in range(width):
+            x = maze.minx + i
+            if east[i] and maze.connect((x, y, z), (x + 1, y, z)):
+                yield (x, y, z), (x + 1, y, z)
+            if south[i] and maze.connect((x, y, z), (x, y + 1, z)):
+                yield (x, y, z), (x, y + 1, z)
+
+
+def eller_rows(width, height=None, horizontal=0.5, vertical=0.5):
+    """
+    Eller's algorithm, generating a maze one row at a time while keeping state for just one row.
+
+    Yields `(east, south)` for each row: lists saying whether each room has a passage to its +x
+    and its +y neighbor.  Rooms join their +x neighbor with probability `horizontal`, and each
+    space continues down through at least one room, each with probability `vertical`.  Without a
+    `height` rows are generated until the caller stops asking.
+    """
+    fresh = itertools.count(1)
+    labels = list(range(width))
+    for j in itertools.count():
+        last = height is not None and j + 1 >= height
+
+        # Rooms in the same space as given by their labels, then join some neighbors
+        sets = DisjointSets()
+        sets.grow(width)
+        firsts = dict()
+        for i, label in enumerate(labels):
+            sets.union(firsts.setdefault(label, i), i)
+
+        east = [False] * width
+        for i in range(width - 1):
+            if sets.find(i) != sets.find(i + 1) and (last or random.random() < horizontal):
+                sets.union(i, i + 1)
+                east[i] = True
+
+        south = [False] * width
+        if not last:
+            members = dict()
+            for i in range(width):
+                members.setdefault(sets.find(i), list()).append(i)
+            for rooms in members.values():
+                down = [i for i in rooms if random.random() < vertical] or [random.choice(rooms)]
+                for i in down:
+                    south[i] = True
+
+        yield east, south
+
+        if last:
+            break
+        labels = [sets.find(i) if south[i] else -next(fresh) for i in range(width)]
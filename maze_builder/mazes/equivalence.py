@@ -1,3 +1,5 @@
+from array import array
+
 
 class Equivalence(object):
     def __init__(self, *values):
@@ -28,4 +30,83 @@ class Equivalence(object):
             # Clear self
             self.canon._values = None
             # Update self
-            self.canon._canon = other.canon
\ No newline at end of file
+            self.canon._canon = other.canon
+
+
+class EquivalenceSets(object):
+    """
+    Set engine for `Topology` built from linked `Equivalence` objects.
+
+    Joining copies whole value sets, so prefer `DisjointSets` for anything large.
+    """
+    def __init__(self):
+        self._equivalences = dict()
+
+    def index(self, value):
+        if value not in self._equivalences:
+            self._equivalences[value] = Equivalence(value)
+        return self._equivalences[value]
+
+    def find(self, index):
+        return index.canon
+
+    def union(self, index0, index1):
+        index0.join(index1)
+        return index1.canon
+
+
+class DisjointSets(object):
+    """
+    Set engine for `Topology` stored in flat integer arrays (index -> parent, index -> rank).
+
+    Each value is given the next free index the first time it is seen; `find` uses path halving
+    and `union` uses union by rank, so a whole run of joins is close to linear.
+    """
+    def __init__(self, values=()):
+        self._indices = dict()
+        self._parents = array('l')
+        self._ranks = array('B')
+        for value in values:
+            self.index(value)
+
+    def __len__(self):
+        return len(self._parents)
+
+    @property
+    def parents(self):
+        """Flat parent array, where roots are their own parents; may be rewritten in place"""
+        return self._parents
+
+    def index(self, value):
+        index = self._indices.get(value)
+        if index is None:
+            index = self._indices[value] = self.grow(1)
+        return index
+
+    def grow(self, count):
+        """Add `count` new singleton sets, returning the index of the first one"""
+        start = len(self._parents)
+        self._parents.extend(range(start, start + count))
+        self._ranks.frombytes(bytes(count))
+        return start
+
+    def find(self, index):
+        parents = self._parents
+        parent = parents[index]
+        while parent != index:
+            grandparent = parents[parent]
+            parents[index] = grandparent
+            index, parent = grandparent, parents[grandparent]
+        return index
+
+    def union(self, index0, index1):
+        root0, root1 = self.find(index0), self.find(index1)
+        if root0 == root1:
+            return root0
+        ranks = self._ranks
+        if ranks[root0] < ranks[root1]:
+            root0, root1 = root1, root0
+        self._parents[root1] = root0
+        if ranks[root0] == ranks[root1]:
+            ranks[root0] += 1
+        return root0
@@ -1,4 +1,4 @@
-from .equivalence import Equivalence
+from .equivalence import DisjointSets
 import itertools
 
 
@@ -25,12 +25,12 @@ class Route(object):
 
 
 class Topology(object):
-    def __init__(self, routes=()):
+    def __init__(self, routes=(), spaces=None):
         self.known_routes = set()
         self.known_room_routes = dict()  # Dict from room pairs to routes
 
         self.active_routes = set()
-        self._spaces = dict()
+        self._spaces = spaces if spaces is not None else DisjointSets()
 
         self.teach(*routes)
 
@@ -100,9 +100,7 @@ class Topology(object):
             )
 
     def space(self, room):
-        if room not in self._spaces:
-            self._spaces[room] = Equivalence(room)
-        return self._spaces[room].canon
+        return self._spaces.find(self._spaces.index(room))
 
     def spaces(self, rooms):
         spaces = list()
@@ -115,10 +113,11 @@ class Topology(object):
     def join(self, rooms):
         if not rooms:
             return
-        spaces = list(self.spaces(rooms))
-        for space in spaces[1:]:
-            spaces[0].join(space)
-        return spaces[0].canon
+        spaces = self.spaces(rooms)
+        space = spaces[0]
+        for other in spaces[1:]:
+            space = self._spaces.union(other, space)
+        return space
 
     def _check(self, route):
         return route not in self.active_routes \
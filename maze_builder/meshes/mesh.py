@@ -20,10 +20,6 @@ def _sub_tuples(t0, t1):
     return tuple(x0 - x1 for x0, x1 in zip(t0, t1))
 
 
-def _dot_tuples(t0, t1):
-    return sum(x0*x1 for x0, x1 in zip(t0, t1))
-
-
 def _local_coordinates(vo, *scalar_coord_pairs):
     return tuple(
         sum((s * (v[i] - vo[i]) for s, v in scalar_coord_pairs), vo[i])
@@ -31,6 +27,11 @@ def _local_coordinates(vo, *scalar_coord_pairs):
     )
 
 
+def run_starts(values):
+    """Indices where each run of equal consecutive `values` starts"""
+    return numpy.flatnonzero(numpy.concatenate(([True], values[1:] != values[:-1]))[:len(values)])
+
+
 MeshAttributes = namedtuple(
     'MeshAttributes',
     ['smoothing_degrees', 'index_base', 'coordinate_rounding', 'default_material']
@@ -77,22 +78,40 @@ class MeshBase(object):
         for i in range(self.count_faces()):
             yield self.get_face(self.attributes.index_base + i)
 
+    def vertex_array(self):
+        """Every vertex as rows of an N x 3 array, rounded like `get_vertex`"""
+        return numpy.array([v for _, v in self.iter_vertices()], dtype=float).reshape(-1, 3)
+
     def find_limits(self, coords, xbounds=None, ybounds=None, zbounds=None):
-        max_limit = -float('inf')
-        min_limit = float('inf')
-        for _, vertex in self.iter_vertices():
-            if xbounds and not xbounds[0] <= vertex[0] <= xbounds[1]:
-                continue
-            if ybounds and not ybounds[0] <= vertex[1] <= ybounds[1]:
-                continue
-            if zbounds and not zbounds[0] <= vertex[2] <= zbounds[1]:
-                continue
-            dot = _dot_tuples(vertex, coords)
-            if dot > max_limit:
-                max_limit = dot
-            if dot < min_limit:
-                min_limit = dot
-        return min_limit, max_limit
+        vertices = self.vertex_array()
+        mask = numpy.ones(len(vertices), dtype=bool)
+        for axis, bounds in enumerate((xbounds, ybounds, zbounds)):
+            if bounds:
+                mask &= (bounds[0] <= vertices[:, axis]) & (vertices[:, axis] <= bounds[1])
+        if not mask.any():
+            return float('inf'), -float('inf')
+        dots = vertices[mask].dot(numpy.asarray(coords, dtype=float))
+        return float(dots.min()), float(dots.max())
+
+    def face_array(self):
+        """Every face's vertex indices as rows of an M x 3 array; the faces must be triangles"""
+        faces = [face.vertices for face in self.iter_faces()]
+        if any(len(vertices) != 3 for vertices in faces):
+            raise RuntimeError('Only meshes of triangles have a face array')
+        return numpy.array(faces, dtype=numpy.int64).reshape(-1, 3)
+
+    def material_runs(self):
+        """`(start, stop, material)` for each run of consecutive faces with the same material"""
+        runs = list()
+        for i, face in enumerate(self.iter_faces()):
+            if runs and runs[-1][2] == face.material:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1, face.material])
+        return [tuple(run) for run in runs]
+
+    def height_grid(self, cell=1.0):
+        return HeightGrid(self.vertex_array(), cell)
 
     def force_vertices(self, vertices, fun):
         return tuple(fun(v) for v in vertices) if vertices else None
@@ -189,6 +208,18 @@ class MeshBase(object):
             self.replace_normal_vertex(i, warp(v))
         return self
 
+    def perform_array_warp(self, warp):
+        """Like `perform_warp`, but `warp` updates an N x 3 array of every vertex at once, in place"""
+        vertices = numpy.array([v for _, v in self.iter_vertices()], dtype=float).reshape(-1, 3)
+        warp(vertices)
+        for i, v in enumerate(vertices.tolist()):
+            self.replace_vertex(i, tuple(v))
+        normals = numpy.array([v for _, v in self.iter_normal_vertices()], dtype=float).reshape(-1, 3)
+        warp(normals)
+        for i, v in enumerate(normals.tolist()):
+            self.replace_normal_vertex(i, tuple(v))
+        return self
+
     def triangle(self, vertices, texture_vertices=None, density=1, material=None):
         """
         Note: v0, v1 are ABSOLUTE to vo; likewise with t0, t1 ABSOLUTE to to
@@ -282,6 +313,17 @@ class MeshBuilder(MeshBase):
         self.normal_vertices.warp(warp)
         return self
 
+    def perform_array_warp(self, warp):
+        self._array_warp(warp, self.vertices)
+        self._array_warp(warp, self.normal_vertices)
+        return self
+
+    def vertex_array(self):
+        vl = self.vertices
+        if not len(vl):
+            return numpy.empty((0, 3))
+        return numpy.frombuffer(vl.data, dtype=vl.data.typecode).reshape(-1, vl.dims).round(vl.ndigits)
+
     # Low-ish level stuff -- necessary part of mesh interface
 
     def count_vertices(self):
@@ -336,6 +378,13 @@ class MeshBuilder(MeshBase):
 
     # Internal
 
+    def _array_warp(self, warp, vl):
+        if not len(vl):
+            return
+        # Warp the vertex array's own storage through a view, then drop its (now stale) lookup cache
+        warp(numpy.frombuffer(vl.data, dtype=vl.data.typecode).reshape(-1, vl.dims))
+        vl.cache.clear()
+
     def _replace_vertex(self, index, coords, vl):
         vl[index - self.attributes.index_base] = coords
 
@@ -352,6 +401,324 @@ class MeshBuilder(MeshBase):
             return self.attributes.index_base + vl.append(coords)
 
 
+class ArrayMeshBuilder(MeshBase):
+    """
+    Mesh of triangles kept in NumPy arrays: vertices as rows of a float64 array, shared by their
+    rounded coordinates, and faces as rows of int32 vertex indices.  Much more compact than
+    `MeshBuilder` for big meshes, and `vertices.array` can be warped or searched all at once.
+    """
+    def __init__(self, **attrs):
+        super().__init__(**attrs)
+
+        self.vertices = VertexBuffer(ndigits=self.attributes.coordinate_rounding)
+        self.texture_vertices = VertexBuffer(ndigits=self.attributes.coordinate_rounding)
+        self.normal_vertices = VertexBuffer(ndigits=self.attributes.coordinate_rounding)
+
+        self.faces = RowBuffer(3, numpy.int32)
+        # Only filled in (with -1 for none) once some face has them
+        self.face_texture_vertices = RowBuffer(3, numpy.int32, fill=-1)
+        self.face_normal_vertices = RowBuffer(3, numpy.int32, fill=-1)
+        self.face_materials = RowBuffer(1, numpy.int32)
+        self.materials = [None]
+
+    # Override
+
+    def perform_warp(self, warp):
+        for vb in (self.vertices, self.normal_vertices):
+            for row in vb.array:
+                row[:] = warp(tuple(row.tolist()))
+            vb.invalidate()
+        return self
+
+    def perform_array_warp(self, warp):
+        for vb in (self.vertices, self.normal_vertices):
+            if len(vb):
+                warp(vb.array)
+                vb.invalidate()
+        return self
+
+    def vertex_array(self):
+        return self.vertices.array.round(self.vertices.ndigits)
+
+    def face_array(self):
+        return self.faces.array
+
+    def material_runs(self):
+        materials = numpy.zeros(len(self.faces), dtype=numpy.int32)
+        materials[:len(self.face_materials)] = self.face_materials.array[:, 0]
+        starts = run_starts(materials)
+        stops = numpy.append(starts[1:], len(materials))
+        return [
+            (start, stop, self.materials[materials[start]])
+            for start, stop in zip(starts.tolist(), stops.tolist())
+        ]
+
+    # Low-ish level stuff -- necessary part of mesh interface
+
+    def count_vertices(self):
+        return len(self.vertices)
+
+    def count_texture_vertices(self):
+        return len(self.texture_vertices)
+
+    def count_normal_vertices(self):
+        return len(self.normal_vertices)
+
+    def count_faces(self):
+        return len(self.faces)
+
+    def enter_vertex(self, coords):
+        return self._enter_vertex(coords, self.vertices)
+
+    def enter_texture_vertex(self, coords):
+        return self._enter_vertex(coords, self.texture_vertices)
+
+    def enter_normal_vertex(self, coords):
+        return self._enter_vertex(coords, self.normal_vertices)
+
+    def get_vertex(self, index):
+        return self._get_vertex(index, self.vertices)
+
+    def get_texture_vertex(self, index):
+        return self._get_vertex(index, self.texture_vertices)
+
+    def get_normal_vertex(self, index):
+        return self._get_vertex(index, self.normal_vertices)
+
+    def replace_vertex(self, index, coords):
+        self.vertices.replace(index - self.attributes.index_base, coords)
+
+    def replace_texture_vertex(self, index, coords):
+        self.texture_vertices.replace(index - self.attributes.index_base, coords)
+
+    def replace_normal_vertex(self, index, coords):
+        self.normal_vertices.replace(index - self.attributes.index_base, coords)
+
+    def enter_face(self, vertices, texture_vertices=None, normal_vertices=None, material=None):
+        if len(vertices) != 3:
+            raise RuntimeError('ArrayMeshBuilder only holds triangles, not {}-sided faces'.format(len(vertices)))
+        i = self.faces.append([self.force_vertex_index(v) for v in vertices])
+        if texture_vertices:
+            self.face_texture_vertices.put(i, [self.force_texture_vertex_index(v) for v in texture_vertices])
+        if normal_vertices:
+            self.face_normal_vertices.put(i, [self.force_normal_vertex_index(v) for v in normal_vertices])
+        material = material or self.attributes.default_material
+        if material is not None:
+            if material not in self.materials:
+                self.materials.append(material)
+            self.face_materials.put(i, [self.materials.index(material)])
+
+    def enter_arrays(self, vertices, faces, material=None, runs=None):
+        """
+        Add a whole block of triangles at once: `vertices` as rows of coordinates, and `faces` as
+        rows of indices into them.  Vertices aren't shared with those already in the mesh.  The
+        faces can have different materials, given as `(start, stop, material)` `runs` of them.
+        """
+        start = self.vertices.extend(vertices)
+        self.vertices.invalidate()
+        first = self.faces.extend(numpy.asarray(faces) + (start + self.attributes.index_base))
+        if runs is None:
+            runs = [(0, len(self.faces) - first, material)]
+        for start, stop, material in runs:
+            material = material or self.attributes.default_material
+            if material is not None:
+                if material not in self.materials:
+                    self.materials.append(material)
+                self.face_materials.put(len(self.faces) - 1, [0])
+                self.face_materials.array[first + start:first + stop] = self.materials.index(material)
+        return first
+
+    def get_face(self, index):
+        i = index - self.attributes.index_base
+        return Face(
+            tuple(self.faces.array[i].tolist()),
+            self._face_indices(i, self.face_texture_vertices),
+            self._face_indices(i, self.face_normal_vertices),
+            self.materials[int(self.face_materials.data[i, 0])] if i < len(self.face_materials) else None,
+        )
+
+    # Internal
+
+    def _face_indices(self, i, rb):
+        if i < len(rb) and rb.data[i, 0] >= 0:
+            return tuple(rb.data[i].tolist())
+        return None
+
+    def _get_vertex(self, index, vb):
+        if isinstance(index, int) and 0 <= index - self.attributes.index_base < len(vb):
+            return vb[index - self.attributes.index_base]
+        else:
+            return vb[vb.enter(index)]
+
+    def _enter_vertex(self, coords, vb):
+        if isinstance(coords, int) and 0 <= coords - self.attributes.index_base < len(vb):
+            return coords
+        else:
+            return self.attributes.index_base + vb.enter(coords)
+
+
+class HeightGrid(object):
+    """
+    Vertices bucketed into square `cell`s over x & y, with the lowest & highest z in each, so the
+    height range over a small x/y window only has to look closely at the cells on its edges.
+    """
+    def __init__(self, vertices, cell=1.0):
+        if len(vertices):
+            # Keep the grid no bigger than 1024 cells across
+            cell = max(cell, float(numpy.ptp(vertices[:, :2], axis=0).max()) / 1024)
+        self.cell = cell
+
+        ij = numpy.floor(vertices[:, :2] / cell).astype(numpy.int64)
+        self.origin = ij.min(axis=0) if len(ij) else numpy.zeros(2, dtype=numpy.int64)
+        ij -= self.origin
+        self.shape = tuple(int(n) + 1 for n in ij.max(axis=0)) if len(ij) else (0, 0)
+
+        cells = ij[:, 0] * self.shape[1] + ij[:, 1]
+        order = numpy.argsort(cells, kind='mergesort')
+        self.vertices = vertices[order]
+        self.starts = numpy.searchsorted(cells[order], numpy.arange(self.shape[0] * self.shape[1] + 1))
+
+        self.minz = numpy.full(self.shape, numpy.inf)
+        self.maxz = numpy.full(self.shape, -numpy.inf)
+        numpy.minimum.at(self.minz.ravel(), cells, vertices[:, 2])
+        numpy.maximum.at(self.maxz.ravel(), cells, vertices[:, 2])
+
+    def find_limits(self, xbounds, ybounds):
+        """Lowest & highest z of vertices within the bounds, like `MeshBase.find_limits`"""
+        (i0, j0), (i1, j1) = (
+            numpy.floor(numpy.array(corner, dtype=float) / self.cell).astype(numpy.int64) - self.origin
+            for corner in ((xbounds[0], ybounds[0]), (xbounds[1], ybounds[1]))
+        )
+        min_limit, max_limit = numpy.inf, -numpy.inf
+
+        # Cells strictly between the edge cells lie wholly inside the bounds
+        inner = self.minz[max(i0 + 1, 0):max(i1, 0), max(j0 + 1, 0):max(j1, 0)]
+        if inner.size:
+            min_limit = inner.min()
+            max_limit = self.maxz[max(i0 + 1, 0):max(i1, 0), max(j0 + 1, 0):max(j1, 0)].max()
+
+        edges = [
+            (i, j)
+            for i in range(max(i0, 0), min(i1, self.shape[0] - 1) + 1)
+            for j in range(max(j0, 0), min(j1, self.shape[1] - 1) + 1)
+            if i in (i0, i1) or j in (j0, j1)
+        ]
+        if edges:
+            vertices = numpy.concatenate([
+                self.vertices[self.starts[cell]:self.starts[cell + 1]]
+                for cell in (i * self.shape[1] + j for i, j in edges)
+            ])
+            mask = (
+                (xbounds[0] <= vertices[:, 0]) & (vertices[:, 0] <= xbounds[1]) &
+                (ybounds[0] <= vertices[:, 1]) & (vertices[:, 1] <= ybounds[1])
+            )
+            if mask.any():
+                min_limit = min(min_limit, vertices[mask, 2].min())
+                max_limit = max(max_limit, vertices[mask, 2].max())
+
+        return float(min_limit), float(max_limit)
+
+
+class RowBuffer(object):
+    """Growable 2D NumPy array, filled in a row at a time; `array` is a view of the rows so far"""
+    def __init__(self, dims=None, dtype=numpy.float64, fill=0):
+        self.dims = dims
+        self.dtype = dtype
+        self.fill = fill
+        self.data = None
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def array(self):
+        if self.data is None:
+            return numpy.empty((0, self.dims or 0), dtype=self.dtype)
+        return self.data[:self.count]
+
+    def append(self, row):
+        return self.put(self.count, row)
+
+    def put(self, index, row):
+        self._reserve(index + 1, len(row))
+        self.data[index] = row
+        self.count = max(self.count, index + 1)
+        return index
+
+    def extend(self, rows):
+        """Append every row of a 2D array, returning the index of the first"""
+        rows = numpy.asarray(rows, dtype=self.dtype)
+        start = self.count
+        if len(rows):
+            self._reserve(start + len(rows), rows.shape[1])
+            self.data[start:start + len(rows)] = rows
+            self.count += len(rows)
+        return start
+
+    def _reserve(self, size, dims):
+        if self.data is None:
+            if self.dims is None:
+                self.dims = dims
+            self.data = numpy.full((max(16, size), self.dims), self.fill, dtype=self.dtype)
+        elif size > len(self.data):
+            grown = numpy.full((max(2 * len(self.data), size), self.dims), self.fill, dtype=self.dtype)
+            grown[:self.count] = self.data[:self.count]
+            self.data = grown
+
+
+class VertexBuffer(RowBuffer):
+    """
+    Row buffer of vertices, sharing rows between vertices which round to the same coordinates.
+    Rows hold coordinates as entered, and are read back rounded, like `VertexArray`.
+    """
+    def __init__(self, dims=None, ndigits=4):
+        super().__init__(dims)
+        self.ndigits = ndigits
+        self._index = dict()
+
+    def __getitem__(self, index):
+        self._check_index(index)
+        return self._rounded(self.data[index].tolist())
+
+    def __iter__(self):
+        for row in self.array.tolist():
+            yield self._rounded(row)
+
+    def enter(self, vertex):
+        """Index of a row matching `vertex`, appending it if there's none"""
+        if self._index is None:
+            self._index = dict()
+            for i, row in enumerate(self.array.tolist()):
+                self._index.setdefault(self._rounded(row), i)
+        rounded = self._rounded(vertex)
+        index = self._index.get(rounded)
+        if index is None:
+            index = self.append(vertex)
+            self._index[rounded] = index
+        return index
+
+    def replace(self, index, vertex):
+        self._check_index(index)
+        if self._index is not None:
+            old = self[index]
+            if self._index.get(old) == index:
+                del self._index[old]
+            self._index[self._rounded(vertex)] = index
+        self.data[index] = vertex
+
+    def invalidate(self):
+        """Rows were changed in place, so look them up afresh next time"""
+        self._index = None
+
+    def _check_index(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError('Index {} is out of range (0, {})'.format(index, self.count))
+
+    def _rounded(self, vertex):
+        return tuple(round(c, self.ndigits) for c in vertex)
+
+
 class MeshWarp(MeshBase):
     def __init__(self, mesh, warp_out=None, warp_in=None):
         self.mesh = mesh
@@ -1,10 +1,15 @@
 from .mesh import MeshBuilder
 import xml.etree.ElementTree as ET
 from io import StringIO
+import itertools
 
 OBJ_INDEX_BASE = 1
 
 
+# Lines formatted & written at once
+CHUNK_LINES = 4096
+
+
 class ObjDumper(object):
     def __init__(self, keywords=('v', 'vt', 'vn', 'f', 'usemtl')):
         self.keywords = set(keywords)
@@ -13,6 +18,16 @@ class ObjDumper(object):
         if keyword in self.keywords:
             fp.write('{} {}\n'.format(keyword, ' '.join(str(arg) for arg in args)))
 
+    def write_block(self, fp, keyword, rows):
+        """Write a line per row (all the same length), formatting them a chunk at a time"""
+        if keyword not in self.keywords or not len(rows):
+            return
+        rows = rows.tolist() if hasattr(rows, 'tolist') else list(rows)
+        line = keyword + ' {}' * len(rows[0]) + '\n'
+        for start in range(0, len(rows), CHUNK_LINES):
+            chunk = rows[start:start + CHUNK_LINES]
+            fp.write((line * len(chunk)).format(*itertools.chain.from_iterable(chunk)))
+
     def _format_face(self, face, index_offset):
         svs = tuple(str(v + index_offset) for v in face.vertices)
         if face.normal_vertices and 'vn' in self.keywords:
@@ -28,14 +43,23 @@ class ObjDumper(object):
     def dump(self, fp, mesh):
         index_offset = OBJ_INDEX_BASE - mesh.attributes.index_base
 
-        for _, vertex in mesh.iter_vertices():
-            self.write(fp, 'v', *vertex)
-
-        for _, vertex in mesh.iter_texture_vertices():
-            self.write(fp, 'vt', *vertex)
+        self.write_block(fp, 'v', mesh.vertex_array())
+        self.write_block(fp, 'vt', [vertex for _, vertex in mesh.iter_texture_vertices()])
+        self.write_block(fp, 'vn', [vertex for _, vertex in mesh.iter_normal_vertices()])
 
-        for _, vertex in mesh.iter_normal_vertices():
-            self.write(fp, 'vn', *vertex)
+        if not mesh.count_texture_vertices() and not mesh.count_normal_vertices():
+            try:
+                faces = mesh.face_array() + index_offset
+            except RuntimeError:
+                pass  # Not just triangles, so write faces one by one
+            else:
+                material = None
+                for start, stop, run_material in mesh.material_runs():
+                    if run_material and run_material != material:
+                        self.write(fp, 'usemtl', run_material)
+                        material = run_material
+                    self.write_block(fp, 'f', faces[start:stop])
+                return
 
         material = None
         for face in mesh.iter_faces():
@@ -0,0 +1,86 @@
+"""
+Perlin noise evaluated over whole NumPy arrays of points at once.
+
+`pnoise2` takes the same arguments as the `noise` package's, and follows its C implementation
+(same permutation & gradient tables, single precision arithmetic, octaves & tiling), so swapping
+one for the other leaves terrain unchanged.
+"""
+import numpy
+
+
+PERMUTATION = numpy.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140, 36, 103, 30, 69,
+    142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219,
+    203, 117, 35, 11, 32, 57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175,
+    74, 165, 71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133, 230,
+    220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161, 1, 216, 80, 73, 209, 76,
+    132, 187, 208, 89, 18, 169, 200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186,
+    3, 64, 52, 217, 226, 250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59,
+    227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44, 154, 163, 70,
+    221, 153, 101, 155, 167, 43, 172, 9, 129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178,
+    185, 112, 104, 218, 246, 97, 228, 251, 34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81,
+    51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115,
+    121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114, 67, 29, 24, 72, 243, 141, 128, 195,
+    78, 66, 215, 61, 156, 180
+] * 2, dtype=numpy.intp)
+
+
+GRAD2 = numpy.array([
+    (1, 1), (-1, 1), (1, -1), (-1, -1), (1, 0), (-1, 0), (1, 0), (-1, 0),
+    (0, 1), (0, -1), (0, 1), (0, -1), (1, 0), (-1, 0), (0, -1), (0, 1),
+], dtype=numpy.float32)
+
+
+def pnoise2(x, y, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=1024, repeaty=1024):
+    x = numpy.asarray(x, dtype=numpy.float32)
+    y = numpy.asarray(y, dtype=numpy.float32)
+    if octaves == 1:
+        return _noise2(x, y, numpy.float32(repeatx), numpy.float32(repeaty))
+
+    freq = numpy.float32(1)
+    amp = numpy.float32(1)
+    total = numpy.zeros(numpy.broadcast(x, y).shape, dtype=numpy.float32)
+    max_amp = numpy.float32(0)
+    for _ in range(octaves):
+        total += _noise2(x * freq, y * freq, numpy.float32(repeatx) * freq, numpy.float32(repeaty) * freq) * amp
+        max_amp += amp
+        freq *= numpy.float32(lacunarity)
+        amp *= numpy.float32(persistence)
+    return total / max_amp
+
+
+def _noise2(x, y, repeatx, repeaty):
+    i = numpy.floor(numpy.fmod(x, repeatx)).astype(numpy.intp)
+    j = numpy.floor(numpy.fmod(y, repeaty)).astype(numpy.intp)
+    ii = numpy.fmod(i + 1, repeatx).astype(numpy.intp) & 255
+    jj = numpy.fmod(j + 1, repeaty).astype(numpy.intp) & 255
+    i &= 255
+    j &= 255
+
+    x = x - numpy.floor(x)
+    y = y - numpy.floor(y)
+    fx = _fade(x)
+    fy = _fade(y)
+
+    a = PERMUTATION[i]
+    b = PERMUTATION[ii]
+    return _lerp(
+        fy,
+        _lerp(fx, _grad2(PERMUTATION[PERMUTATION[a + j]], x, y),
+              _grad2(PERMUTATION[PERMUTATION[b + j]], x - 1, y)),
+        _lerp(fx, _grad2(PERMUTATION[PERMUTATION[a + jj]], x, y - 1),
+              _grad2(PERMUTATION[PERMUTATION[b + jj]], x - 1, y - 1)),
+    )
+
+
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def _lerp(t, a, b):
+    return a + t * (b - a)
+
+
+def _grad2(h, x, y):
+    g = GRAD2[h & 15]
+    return x * g[..., 0] + y * g[..., 1]
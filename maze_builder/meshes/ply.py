@@ -0,0 +1,43 @@
+"""
+Binary PLY output for meshes of triangles, written straight from the vertex & face arrays.
+
+Vertices are stored as single precision floats and faces as lists of three 32 bit indices, which
+is far smaller and quicker to write than OBJ text.  Materials, texture & normal vertices aren't
+included.
+"""
+import numpy
+
+
+PLY_HEADER = '''ply
+format binary_little_endian 1.0
+element vertex {vertices}
+property float x
+property float y
+property float z
+element face {faces}
+property list uchar int vertex_indices
+end_header
+'''
+
+
+FACE_DTYPE = numpy.dtype([('count', 'u1'), ('vertices', '<i4', (3,))])
+
+
+class PlyDumper(object):
+    def dump(self, fp, mesh):
+        vertices = mesh.vertex_array().astype('<f4')
+        faces = numpy.empty(mesh.count_faces(), dtype=FACE_DTYPE)
+        faces['count'] = 3
+        faces['vertices'] = mesh.face_array() - mesh.attributes.index_base
+
+        fp.write(PLY_HEADER.format(vertices=len(vertices), faces=len(faces)).encode('ascii'))
+        fp.write(vertices.tobytes())
+        fp.write(faces.tobytes())
+
+
+def dump_ply(fp, mesh):
+    if isinstance(fp, str):
+        with open(fp, 'wb') as f:
+            PlyDumper().dump(f, mesh)
+    else:
+        PlyDumper().dump(fp, mesh)
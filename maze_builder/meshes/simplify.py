@@ -0,0 +1,277 @@
+"""
+Mesh simplification by edge collapses, bounded by how far the surface may move.
+
+Each vertex carries the quadric of the planes of the faces it started on (and of those merged
+into it), measuring the sum of squared distances from those planes.  A vertex is collapsed into a
+neighbor when, at the neighbor's position, that stays within `tolerance` squared -- so flat areas
+and straight creases merge without any error at all, and warped areas only as far as they allow.
+
+Collapses are done in passes over the whole mesh with NumPy: each pass picks one of the cheapest
+collapses for every vertex, drops those which would fold faces over or pinch the surface, then
+performs a set of them far enough apart not to interfere.  Vertices on the mesh's boundary only
+slide along it, and those on edges shared by more than two faces, or on borders between materials,
+stay where they are.
+"""
+import numpy
+from .mesh import ArrayMeshBuilder, run_starts
+
+
+# Allowance for rounding when checking a collapse moves the surface by no more than the tolerance
+EPSILON = 1e-12
+
+
+# Collapses are taken in this many bands of cost up to the tolerance, cheapest band first
+COST_LEVELS = 4
+
+
+# Stop once a pass collapses fewer than one edge in this many faces
+STALL = 512
+
+
+# Most rounds of picking non-overlapping collapses in one pass
+ROUNDS = 8
+
+
+def simplify(vertices, faces, tolerance=0.0, fixed=None, passes=100):
+    """
+    Simplify the triangles `faces` (rows of indices into `vertices`), keeping any vertices marked
+    `fixed`.  Returns the remaining vertices & faces, and the index each remaining face had in `faces`.
+    """
+    vertices = numpy.asarray(vertices, dtype=float).reshape(-1, 3)
+    faces = numpy.asarray(faces, dtype=numpy.int64).reshape(-1, 3)
+    count = len(vertices)
+    face_indices = numpy.arange(len(faces))
+
+    random_state = numpy.random.RandomState(0)
+    quadrics, boundary, stuck = _plane_quadrics(vertices, faces, count)
+    fixed = stuck | (False if fixed is None else numpy.asarray(fixed, dtype=bool))
+    normals = _normals(vertices, faces)
+    limit = tolerance * tolerance + EPSILON
+
+    for _ in range(passes):
+        removed, kept = _choose_collapses(
+            vertices, faces, normals[face_indices], quadrics, boundary, fixed, limit, random_state)
+        if not len(removed):
+            break
+
+        remap = numpy.arange(count)
+        remap[removed] = kept
+        faces = remap[faces]
+        quadrics[kept] += quadrics[removed]
+
+        # The faces either side of each collapsed edge vanish
+        whole = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+        faces = faces[whole]
+        face_indices = face_indices[whole]
+        if len(removed) * STALL <= len(faces):
+            break
+
+    used, faces = numpy.unique(faces, return_inverse=True)
+    return vertices[used], faces.reshape(-1, 3), face_indices
+
+
+def _monomials(vertices):
+    """Terms of the quadrics for each vertex"""
+    x, y, z = vertices.T
+    return numpy.stack([x*x, y*y, z*z, numpy.ones_like(x), x*y, x*z, x, y*z, y, z], axis=1)
+
+
+def _plane_quadrics(vertices, faces, count):
+    """
+    Squared distance from the planes of the faces around each vertex, summed, as coefficients of
+    the `_monomials` of a position.  Edges along the boundary add planes square to their face, so
+    the boundary can only slide along itself.  Returns those, and which vertices are on the
+    boundary or (on edges shared by more than two faces) must stay put.
+    """
+    normals = _unit(_normals(vertices, faces))
+
+    edges = numpy.stack([faces, numpy.roll(faces, -1, axis=1)], axis=-1).reshape(-1, 2)
+    _, which, counts = numpy.unique(
+        edges.min(axis=1) * count + edges.max(axis=1), return_inverse=True, return_counts=True)
+    counts = counts[which]
+    boundary = numpy.zeros(count, dtype=bool)
+    boundary[edges[counts == 1]] = True
+    fixed = numpy.zeros(count, dtype=bool)
+    fixed[edges[counts > 2]] = True
+
+    along = counts == 1
+    ends = vertices[edges[along]]
+    edge_normals = _unit(numpy.cross(ends[:, 1] - ends[:, 0], numpy.repeat(normals, 3, axis=0)[along]))
+
+    quadrics = numpy.zeros((count, 10))
+    for k in range(3):
+        numpy.add.at(quadrics, faces[:, k], _plane_terms(normals, vertices[faces[:, 0]]))
+    for k in range(2):
+        numpy.add.at(quadrics, edges[along, k], _plane_terms(edge_normals, ends[:, 0]))
+    return quadrics, boundary, fixed
+
+
+def _plane_terms(normals, points):
+    """Coefficients of the `_monomials` giving the squared distance from each plane"""
+    a, b, c = normals.T
+    d = -numpy.einsum('ij,ij->i', normals, points)
+    return numpy.stack([a*a, b*b, c*c, d*d, 2*a*b, 2*a*c, 2*a*d, 2*b*c, 2*b*d, 2*c*d], axis=1)
+
+
+def _unit(vectors):
+    lengths = numpy.linalg.norm(vectors, axis=1)[:, None]
+    return numpy.divide(vectors, lengths, out=numpy.zeros_like(vectors), where=lengths > 0)
+
+
+def _sorted_unique(values):
+    values = numpy.sort(values)
+    first = numpy.ones(len(values), dtype=bool)
+    first[1:] = values[1:] != values[:-1]
+    return values[first]
+
+
+def _ranges(starts, stops):
+    """Indices from every `starts[i]` up to `stops[i]` one after another, and the `i` of each"""
+    sizes = stops - starts
+    owners = numpy.repeat(numpy.arange(len(sizes)), sizes)
+    offsets = numpy.arange(sizes.sum()) - numpy.repeat(numpy.cumsum(sizes) - sizes, sizes)
+    return starts[owners] + offsets, owners
+
+
+def _choose_collapses(vertices, faces, normals, quadrics, boundary, fixed, limit, random_state):
+    count = len(vertices)
+
+    # Every edge both ways, as `v * count + u` keys: collapsing v into u
+    a = faces.ravel()
+    b = faces[:, [1, 2, 0]].ravel()
+    keys = _sorted_unique(numpy.concatenate([a * count + b, b * count + a]))
+    edge_starts = numpy.searchsorted(keys, numpy.arange(count + 1) * count)
+    v, u = keys // count, keys % count
+
+    # Cheapest allowable collapse of each vertex; those on the boundary only move along it
+    movable = ~fixed[v] & (boundary[u] | ~boundary[v])
+    v, u = v[movable], u[movable]
+    monomials = _monomials(vertices)
+    settled = numpy.einsum('ij,ij->i', quadrics, monomials)
+    cost = numpy.einsum('ij,ij->i', quadrics[v], monomials[u]) + settled[u]
+    allowed = cost <= limit
+    v, u, cost = v[allowed], u[allowed], cost[allowed]
+    if not len(v):
+        return v, u
+    # Picking at random within the cheapest band, so one that can't be done won't always be tried
+    rank = numpy.floor(COST_LEVELS * cost / limit) + random_state.random_sample(len(cost))
+    first = numpy.append(True, v[1:] != v[:-1])
+    cheapest = numpy.minimum.reduceat(rank, numpy.flatnonzero(first))[numpy.cumsum(first) - 1]
+    best = numpy.flatnonzero(rank == cheapest)
+    best = best[numpy.append(True, v[best][1:] != v[best][:-1])]
+    v, u, rank = v[best], u[best], rank[best]
+
+    # No face around v may be turned over (or flattened) by moving its corner to u, compared to
+    # the face it started out as so it can't turn a little at a time either
+    corners = numpy.argsort(faces.ravel(), kind='mergesort')
+    corner_starts = numpy.searchsorted(faces.ravel()[corners], numpy.arange(count + 1))
+    around, face_owners = _ranges(corner_starts[v], corner_starts[v + 1])
+    around = corners[around] // 3
+    moved = faces[around]
+    staying = ~(moved == u[face_owners, None]).any(axis=1)
+    old = normals[around]
+    moved = numpy.where(moved == v[face_owners, None], u[face_owners, None], moved)
+    new = _normals(vertices, moved)
+    folded = staying & (
+        (numpy.einsum('ij,ij->i', old, new) <= 0) |
+        (numpy.einsum('ij,ij->i', new, new) <= EPSILON * numpy.einsum('ij,ij->i', old, old))
+    )
+    ok = numpy.bincount(face_owners, weights=folded, minlength=len(v)) == 0
+
+    # The edge must have two faces (or one along the boundary), and the common neighbors of v & u
+    # must be just those across them, or the surface pinches
+    sides = numpy.bincount(face_owners, weights=~staying, minlength=len(v))
+    ring, owners = _ranges(edge_starts[v], edge_starts[v + 1])
+    shared = u[owners] * count + keys[ring] % count
+    found = numpy.minimum(numpy.searchsorted(keys, shared), len(keys) - 1)
+    common = numpy.bincount(owners, weights=keys[found] == shared, minlength=len(v))
+    ok &= (sides == numpy.where(boundary[v], 1, 2)) & (common == sides)
+
+    v, u, rank = v[ok], u[ok], rank[ok]
+    ring_ok = ok[owners]
+    ring, owners = ring[ring_ok], numpy.cumsum(ok)[owners[ring_ok]] - 1
+    if not len(v):
+        return v, u
+
+    # Perform collapses far enough apart not to interfere: neither's v or u may be in the other's
+    # neighborhood (v & its neighbors).  Cheaper ones go first, with ties broken at random, as any
+    # ordering over the mesh would leave only its corners winning.  Each round takes the collapses
+    # ahead of every other they'd interfere with, then drops those interfering with the ones taken
+    priority = numpy.empty(len(v), dtype=numpy.int64)
+    priority[numpy.argsort(rank)] = numpy.arange(len(v))
+    ring = numpy.concatenate([v, keys[ring] % count]), numpy.concatenate([numpy.arange(len(v)), owners])
+    core = numpy.concatenate([v, u]), numpy.tile(numpy.arange(len(v)), 2)
+    chosen = numpy.zeros(len(v), dtype=bool)
+    for _ in range(ROUNDS):
+        ring_first = _first_claims(*ring, priority, count)
+        core_first = _first_claims(*core, priority, count)
+        won = numpy.bincount(core[1], minlength=len(v)) > 0
+        won[core[1][ring_first[core[0]] < priority[core[1]]]] = False
+        won[ring[1][core_first[ring[0]] < priority[ring[1]]]] = False
+        chosen |= won
+
+        ring_taken = numpy.zeros(count, dtype=bool)
+        ring_taken[ring[0][won[ring[1]]]] = True
+        core_taken = numpy.zeros(count, dtype=bool)
+        core_taken[core[0][won[core[1]]]] = True
+        dropped = won.copy()
+        dropped[core[1][ring_taken[core[0]]]] = True
+        dropped[ring[1][core_taken[ring[0]]]] = True
+        ring = tuple(part[~dropped[ring[1]]] for part in ring)
+        core = tuple(part[~dropped[core[1]]] for part in core)
+        if not len(core[0]):
+            break
+    return v[chosen], u[chosen]
+
+
+def _first_claims(claims, owners, priority, count):
+    """Lowest priority among the owners claiming each vertex"""
+    first = numpy.full(count, len(priority))
+    numpy.minimum.at(first, claims, priority[owners])
+    return first
+
+
+def _normals(vertices, faces):
+    a = vertices[faces[:, 0]]
+    (x0, y0, z0), (x1, y1, z1) = (vertices[faces[:, k]].T - a.T for k in (1, 2))
+    return numpy.stack([y0*z1 - z0*y1, z0*x1 - x0*z1, x0*y1 - y0*x1], axis=1)
+
+
+def simplify_mesh(mesh, tolerance=0.0):
+    """
+    Copy of the triangle mesh `mesh` simplified to within `tolerance`, as an `ArrayMeshBuilder` with
+    the same attributes.  Texture & normal vertices aren't carried over, so it mustn't have any.
+    """
+    if mesh.count_texture_vertices() or mesh.count_normal_vertices():
+        raise RuntimeError('Only meshes without texture or normal vertices can be simplified')
+
+    faces = numpy.asarray(mesh.face_array(), dtype=numpy.int64) - mesh.attributes.index_base
+    vertices = mesh.vertex_array()
+
+    materials = list()
+    face_materials = numpy.zeros(len(faces), dtype=numpy.int64)
+    for start, stop, material in mesh.material_runs():
+        if material not in materials:
+            materials.append(material)
+        face_materials[start:stop] = materials.index(material)
+
+    # Vertices between faces of different materials stay put, so the borders keep their shape
+    lowest = numpy.full(len(vertices), len(materials))
+    highest = numpy.full(len(vertices), -1)
+    for k in range(3):
+        numpy.minimum.at(lowest, faces[:, k], face_materials)
+        numpy.maximum.at(highest, faces[:, k], face_materials)
+
+    vertices, faces, kept = simplify(vertices, faces, tolerance, fixed=lowest < highest)
+
+    # One block of vertices, so the borders between materials stay joined
+    face_materials = face_materials[kept]
+    starts = run_starts(face_materials)
+    stops = numpy.append(starts[1:], len(faces))
+    runs = [
+        (start, stop, materials[face_materials[start]])
+        for start, stop in zip(starts.tolist(), stops.tolist())
+    ]
+    result = ArrayMeshBuilder(**mesh.attributes._asdict())
+    result.enter_arrays(vertices, faces, runs=runs)
+    return result
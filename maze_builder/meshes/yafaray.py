@@ -1,8 +1,11 @@
 from collections import namedtuple
 from contextlib import contextmanager
+import functools
 from .mesh import MeshBuilder
 import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
 import io
+import itertools
 import math
 import xmlwitch
 from maze_builder.util import timed, is_verbose
@@ -11,6 +14,10 @@ from maze_builder.util import timed, is_verbose
 YAFARAY_INDEX_BASE = 0
 
 
+# Mesh lines formatted & written at once
+CHUNK_LINES = 4096
+
+
 class Element(object):
     __slots__ = ('tag', 'text', 'tail', '_attrib', '_children')
 
@@ -77,6 +84,21 @@ class Element(object):
         elif not isinstance(self._children, list):
             raise 'Cannot add child to generator'
 
+    def overlay(self):
+        """
+        Copy sharing this element's children: the copy's own list of children can be changed
+        freely, but the children themselves need overlaying too before they're changed.
+        """
+        copied = Element(self.tag, self.text, self.tail, **self.attrib)
+        copied._children = list(self._children) if isinstance(self._children, list) else self._children
+        return copied
+
+    def overlay_child(self, child):
+        """Swap `child` for an overlay of it, which can then be changed without touching the original"""
+        copied = child.overlay()
+        self._children = [copied if other is child else other for other in self.children]
+        return copied
+
     @classmethod
     def deepcopy(cls, element):
         copied = cls(element.tag, element.text, element.tail, **element.attrib)
@@ -91,6 +113,75 @@ class Element(object):
                     child.write(witch)
 
 
+class MeshElement(Element):
+    """
+    `<mesh>` element whose points & faces are formatted straight into the file a chunk at a time,
+    rather than as an `Element` (and an xmlwitch node) each.
+    """
+    __slots__ = ('mesh', 'material_map')
+
+    def __init__(self, mesh, material_map=None, **attrib):
+        super().__init__('mesh', **attrib)
+        self.mesh = mesh
+        self.material_map = material_map
+
+    @property
+    def has_children(self):
+        return True
+
+    def write(self, witch):
+        with witch['mesh'](**self.attrib):
+            # Lines are indented to match what xmlwitch writes around them
+            for chunk in mesh_lines(self.mesh, '\n' + witch._indent * witch._indentation, self.material_map):
+                witch.write(chunk)
+
+
+def mesh_lines(mesh, prefix, material_map=None):
+    """Chunks of `<p>`, `<uv>`, `<set_material>` & `<f>` lines for the mesh, each line preceded by `prefix`"""
+    index_offset = YAFARAY_INDEX_BASE - mesh.attributes.index_base
+
+    yield from _format_block(prefix + '<p x="{}" y="{}" z="{}" />', mesh.vertex_array().tolist())
+    yield from _format_block(
+        prefix + '<uv u="{}" v="{}" />',
+        [vertex[:2] for _, vertex in mesh.iter_texture_vertices()]
+    )
+
+    material_line = prefix + '<set_material sval={} />'
+    material = None
+    if not mesh.count_texture_vertices():
+        faces = (mesh.face_array() + index_offset).tolist()
+        for start, stop, run_material in mesh.material_runs():
+            run_material = material_map[run_material] if material_map else run_material
+            if run_material and run_material != material:
+                yield material_line.format(quoteattr(str(run_material)))
+                material = run_material
+            yield from _format_block(prefix + '<f a="{}" b="{}" c="{}" />', faces[start:stop])
+        return
+
+    face_line = prefix + '<f a="{}" b="{}" c="{}" />'
+    uv_face_line = prefix + '<f a="{}" b="{}" c="{}" uv_a="{}" uv_b="{}" uv_c="{}" />'
+    lines = list()
+    for face in mesh.iter_faces():
+        face_material = material_map[face.material] if material_map else face.material
+        if face_material and face_material != material:
+            lines.append(material_line.format(quoteattr(str(face_material))))
+            material = face_material
+        if face.texture_vertices:
+            lines.append(uv_face_line.format(*(v + index_offset for v in face.vertices + face.texture_vertices)))
+        else:
+            lines.append(face_line.format(*(v + index_offset for v in face.vertices)))
+        if len(lines) >= CHUNK_LINES:
+            yield ''.join(lines)
+            lines = list()
+    yield ''.join(lines)
+
+
+def _format_block(line, rows):
+    for start in range(0, len(rows), CHUNK_LINES):
+        chunk = rows[start:start + CHUNK_LINES]
+        yield (line * len(chunk)).format(*itertools.chain.from_iterable(chunk))
+
+
 def matches(child, tag, **attrib):
     if tag is not None and child.tag != tag:
         return False
@@ -101,8 +192,14 @@ def matches(child, tag, **attrib):
 
 
 
+@functools.lru_cache(maxsize=8)
+def base_scene(xml):
+    """Scene parsed from `xml`, parsed once & shared; change only overlays of it"""
+    return Element.deepcopy(ET.fromstring(xml))
+
+
 def dump_yafaray(filename, xml, scene, *args, **kwargs):
-    root = Element.deepcopy(ET.fromstring(xml))
+    root = base_scene(xml).overlay()
 
     # Lights
     if scene.background:
@@ -187,8 +284,6 @@ def insert_mesh(parent, mesh, material_map=None):
     Returns a `xml.etree.ElementTree` compatible `<mesh>` element.  You will need to either convert this
     to a string, or incorporate into a larger XML object to use it in yafaray.
     """
-    index_offset = YAFARAY_INDEX_BASE - mesh.attributes.index_base
-
     mesh_id = '1'
 
     kwargs = dict(
@@ -203,36 +298,8 @@ def insert_mesh(parent, mesh, material_map=None):
 
     mesh_id = str(1 + len(parent.findall('mesh')))
     kwargs.update(id=mesh_id)
-    top = parent.child('mesh', **kwargs)
-
-    @top.generate
-    def generate_mesh():
-        for _, vertex in mesh.iter_vertices():
-            yield Element('p', **xyz(vertex, mesh.attributes.coordinate_rounding))
-
-        for _, vertex in mesh.iter_texture_vertices():
-            yield Element('uv', u=str(vertex[0]), v=str(vertex[1]))
-
-        material = None
-        for face in mesh.iter_faces():
-            face_material = material_map[face.material] if material_map else face.material
-            if face_material and face_material != material:
-                yield Element('set_material', sval=str(face_material))
-                material = face_material
-
-            kwargs = dict(
-                a=str(face.vertices[0] + index_offset),
-                b=str(face.vertices[1] + index_offset),
-                c=str(face.vertices[2] + index_offset),
-            )
-            if face.texture_vertices:
-                kwargs.update(
-                    uv_a=str(face.texture_vertices[0] + index_offset),
-                    uv_b=str(face.texture_vertices[1] + index_offset),
-                    uv_c=str(face.texture_vertices[2] + index_offset)
-                )
-
-            yield Element('f', **kwargs)
+    top = MeshElement(mesh, material_map, **kwargs)
+    parent.extend([top])
 
     if mesh.attributes.smoothing_degrees is not None:
         parent.child(
@@ -263,6 +330,7 @@ def insert_ambience(parent, ambience):
 def insert_background(parent, background):
     elem = parent.find('background')
     if elem:
+        elem = parent.overlay_child(elem)
         elem.remove_all('color')
     else:
         elem = parent.child('background', name='world_background')
@@ -0,0 +1,99 @@
+"""
+Minimal streaming PNG writer, for images too tall to hold in memory at once.
+
+Scanlines are compressed as they're written, so only one row and the compressor's window are
+kept around.  The height doesn't need to be known up front: it's patched into the header when
+the writer is closed, as long as the file can seek.
+"""
+import struct
+import zlib
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+CHUNK_SIZE = 1 << 16
+
+
+MODES = {
+    'L': (1, 0),
+    'RGB': (3, 2),
+    'RGBA': (4, 6),
+}
+
+
+class PngWriter(object):
+    def __init__(self, fp, width, height=None, mode='RGB', level=6):
+        if mode not in MODES:
+            raise RuntimeError('Mode should be one of {}, not {}'.format(sorted(MODES), mode))
+        self.fp = fp
+        self.width = width
+        self.height = height
+        self.channels, self.color_type = MODES[mode]
+        self.rows = 0
+        self._compressor = zlib.compressobj(level)
+        self._pending = list()
+        self._pending_size = 0
+        self._header_offset = fp.tell() + len(PNG_SIGNATURE) if fp.seekable() else None
+
+        fp.write(PNG_SIGNATURE)
+        self._write_header(height or 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def write_row(self, row):
+        """Write one scanline, as `width * channels` bytes"""
+        if len(row) != self.width * self.channels:
+            raise RuntimeError('Row should be {} bytes, not {}'.format(self.width * self.channels, len(row)))
+        # Filter type 0, the row is stored as is
+        self._compress(b'\x00')
+        self._compress(bytes(row))
+        self.rows += 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def close(self):
+        self._pending.append(self._compressor.flush())
+        self._flush()
+        self._write_chunk(b'IEND', b'')
+
+        if self.height is None:
+            if self._header_offset is None:
+                raise RuntimeError('Height must be given up front to write to an unseekable file')
+            end = self.fp.tell()
+            self.fp.seek(self._header_offset)
+            self._write_header(self.rows)
+            self.fp.seek(end)
+        elif self.rows != self.height:
+            raise RuntimeError('Wrote {} rows of an image {} high'.format(self.rows, self.height))
+
+    def _write_header(self, height):
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, height, 8, self.color_type, 0, 0, 0))
+
+    def _compress(self, data):
+        data = self._compressor.compress(data)
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+            if self._pending_size >= CHUNK_SIZE:
+                self._flush()
+
+    def _flush(self):
+        data = b''.join(self._pending)
+        self._pending = list()
+        self._pending_size = 0
+        if data:
+            self._write_chunk(b'IDAT', data)
+
+    def _write_chunk(self, kind, data):
+        self.fp.write(struct.pack('>I', len(data)))
+        self.fp.write(kind)
+        self.fp.write(data)
+        self.fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
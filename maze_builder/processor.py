@@ -1,19 +1,32 @@
+import io
 import random
-import subprocess
 import os.path
-from .util import timed, verbosity, is_verbose
+from .util import timed, verbosity, is_verbose, working_directory
 from .random2 import weighted_choice, Choice
 from maze_builder.sewer import Pipeline
 import itertools
+import re
 
 
 TWITTER_FILESIZE_LIMIT = 2999000 # About 3 Meg, we round down
-NEW_FILESIZE_LIMIT = '1999kb'
+JPEG_QUALITY = 40, 95  # Range of JPEG qualities searched when shrinking, before scaling down
+JPEG_SCALE = 0.7
 OUT_FILENAME = 'out.png'
+STRIP_FILENAME = 'out.strip{}.png'
 OUT_YAFARAY = 'out', 'out.tga'
 JPG_FILENAME = 'out{}.jpg'
 
 
+# Processor running a batch, inherited by forked workers rather than pickled
+_batch_processor = None
+
+
+def _build_numbered(number, seed):
+    directory = _batch_processor.build_numbered(number, seed)
+    _batch_processor.finish_renders()
+    return directory
+
+
 class PipelineBuilder(object):
     def __init__(self, *steps):
         self.pipeline = Pipeline(*steps)
@@ -29,7 +42,14 @@ class Processor(object):
         self.verbose = args.verbose
         self.default_status = default_status
         self.builders = Choice.of(builders)
+        self._builder = None
         self._twitter = None
+        render_jobs = getattr(args, 'render_jobs', 1) or 1
+        if render_jobs > 1:
+            from .render import RenderQueue
+            self.renders = RenderQueue(render_jobs)
+        else:
+            self.renders = None
 
     @property
     def twitter(self):
@@ -45,23 +65,90 @@ class Processor(object):
             if self.args.tweet:
                 self.tweet(filename=OUT_FILENAME)
 
-            builder = self.args.builder or 'default'
-
-            try:
-                builder = self.builders(tag=builder)
-            except:
-                print('No builder named `{}`. Available builders are:'.format(builder))
-                for name in sorted(self.builders.tags()):
-                    print(' * {}'.format(name))
-                raise RuntimeError('No builder named `{}`'.format(builder))
+            if getattr(self.args, 'count', 1) > 1 or getattr(self.args, 'out_dir', None):
+                self.batch()
+            else:
+                self.select_builder().build(self, self.verbose)
+            self.finish_renders()
+
+    def select_builder(self):
+        builder = self.args.builder or 'default'
+
+        try:
+            return self.builders(tag=builder)
+        except:
+            print('No builder named `{}`. Available builders are:'.format(builder))
+            for name in sorted(self.builders.tags()):
+                print(' * {}'.format(name))
+            raise RuntimeError('No builder named `{}`'.format(builder))
+
+    def batch(self):
+        """
+        Build `args.count` mazes, each in its own numbered directory under `args.out_dir`, with one
+        builder made (by each worker) for them all.  With `args.workers` > 1 they're built by forked
+        processes.
+        """
+        global _batch_processor
+        import multiprocessing
+
+        count = getattr(self.args, 'count', 1)
+        workers = min(count, getattr(self.args, 'workers', 1) or 1)
+        self.out_dir = os.path.abspath(self.args.out_dir or '.')
+        self.out_format = '{{:0{}d}}'.format(len(str(count - 1)))
+        jobs = [(number, random.getrandbits(32)) for number in range(count)]
+        self._builder = None
+
+        with timed(is_verbose(1), 'Building {} mazes...'.format(count), 'All mazes built in {0:.3f}s'):
+            if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+                _batch_processor = self
+                try:
+                    with multiprocessing.get_context('fork').Pool(workers) as pool:
+                        return pool.starmap(_build_numbered, jobs)
+                finally:
+                    _batch_processor = None
             else:
-                builder.build(self, self.verbose)
+                return list(itertools.starmap(self.build_numbered, jobs))
+
+    def finish_renders(self):
+        """Wait for renders still running in the background, and post-process them"""
+        if self.renders is not None:
+            self.renders.finish()
+            if is_verbose(1):
+                print(self.renders.summary())
+
+    def render(self, name, args, then):
+        """
+        Run a renderer with `args`, then the post-processing step `then(job)`.  With several
+        `args.render_jobs` this only queues it, and it's run alongside whatever's next.
+        """
+        if self.renders is None:
+            import subprocess
+            with timed(is_verbose(1), '{} is rendering maze...'.format(name), 'Maze rendered in {0:.3f}s'):
+                subprocess.check_call(args)
+            return then(None)
+        else:
+            self.renders.submit(name, args, then)
+
+    def build_numbered(self, number, seed):
+        random.seed(seed)
+        if self._builder is None:
+            self._builder = self.select_builder()
+        directory = os.path.join(self.out_dir, self.out_format.format(number))
+        with verbosity(self.verbose), working_directory(directory):
+            with timed(is_verbose(1), 'Building maze in {}...'.format(directory), 'Maze built in {0:.3f}s'):
+                self._builder.build(self, self.verbose)
+        return directory
 
     def process_obj(self, filename):
         if self.verbose > 0:
             print('No OBJ handler registered, pipeline stopping')
         return
 
+    def process_ply(self, filename):
+        if self.verbose > 0:
+            print('No PLY handler registered, pipeline stopping')
+        return
+
     def process_yafaray(self, filename):
         if not self.args or not self.args.yafaray:
             if self.verbose > 0:
@@ -86,13 +173,19 @@ class Processor(object):
 
         yafaray_args.extend((filename, OUT_YAFARAY[0]))
 
-        with timed(is_verbose(1), 'Yafaray is rendering maze...', 'Maze rendered in {0:.3f}s'):
-            subprocess.check_call(yafaray_args)
+        self.render('Yafaray', yafaray_args, self._after_yafaray)
 
-        filename = self._convert(OUT_YAFARAY[-1])
+    def _after_yafaray(self, job):
+        image = self._load(OUT_YAFARAY[-1])
 
         if self.args.keys:
+            # Encode the decoded render just once into what's tweeted: PNG if it fits, else JPEG
+            with timed(is_verbose(1), 'Converting image...', 'Converted image in {0:.3f}s'):
+                filename = save_image_within(image, TWITTER_FILESIZE_LIMIT, OUT_FILENAME, JPG_FILENAME.format(0))
             self.tweet(filename=filename)
+        else:
+            with timed(is_verbose(1), 'Converting image...', 'Converted image in {0:.3f}s'):
+                image.save(OUT_FILENAME)
 
     def process_pov(self, filename):
         if not self.args or not self.args.pov:
@@ -116,13 +209,53 @@ class Processor(object):
             pov_args.extend('+L{}'.format(path.strip()) for path in self.args.include_path.split(','))
         pov_args.extend([
             '+I{}'.format(filename),
-            '+O{}'.format(OUT_FILENAME),
             '-P', '-D', '-V', '+FN8'
         ])
 
-        with timed(is_verbose(1), 'POV-Ray is rendering maze...', 'Maze rendered in {0:.3f}s'):
-            subprocess.check_call(pov_args)
-
+        strips = getattr(self.args, 'strips', 1) or 1
+        size = read_pov_size(pov_args) if strips > 1 else None
+        if size:
+            self.render_strips('POV-Ray', pov_args, size, strips, self._after_pov)
+        else:
+            if strips > 1 and self.verbose > 0:
+                print('Image height not found in POV-Ray options, rendering the whole frame at once')
+            self.render('POV-Ray', pov_args + ['+O{}'.format(OUT_FILENAME)], self._after_pov)
+
+    def render_strips(self, name, args, size, strips, then):
+        """
+        Render the frame as horizontal `strips` at once, using POV-Ray's start & end row options,
+        then stitch them together into `OUT_FILENAME` before calling `then`.
+        """
+        from .render import RenderQueue
+
+        width, height = size
+        strips = min(strips, height)
+        rows = [height * i // strips for i in range(strips + 1)]
+        remaining = [strips]
+
+        def stitch(job):
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+            filenames = [STRIP_FILENAME.format(i) for i in range(strips)]
+            with timed(is_verbose(1), 'Stitching {} strips...'.format(strips), 'Stitched in {0:.3f}s'):
+                stitch_strips(filenames, rows, size, OUT_FILENAME)
+            for filename in filenames:
+                os.remove(filename)
+            then(job)
+
+        queue = self.renders or RenderQueue(strips)
+        for i in range(strips):
+            queue.submit(name, args + [
+                '+SR{}'.format(rows[i] + 1),
+                '+ER{}'.format(rows[i + 1]),
+                '+O{}'.format(STRIP_FILENAME.format(i)),
+            ], stitch)
+        if queue is not self.renders:
+            with timed(is_verbose(1), '{} is rendering maze in {} strips...'.format(name, strips), 'Maze rendered in {0:.3f}s'):
+                queue.finish()
+
+    def _after_pov(self, job):
         if self.args.keys:
             self.tweet(filename=OUT_FILENAME)
 
@@ -146,14 +279,14 @@ class Processor(object):
             self.twitter.destroy_friendship(user_id)
 
     def tweet(self, status=None, filename=None):
-        if status is None and self.default_status is not None:
-            status = self.default_status() if callable(self.default_status) else self.default_status
-
         if not self.args or not self.args.keys:
             if self.verbose > 0:
                 print('No twitter keys registered, pipeline stopping')
             return
 
+        if status is None and self.default_status is not None:
+            status = self.default_status() if callable(self.default_status) else self.default_status
+
         if status:
             kwargs = dict(status=status)
         else:
@@ -173,43 +306,22 @@ class Processor(object):
         else:
             raise RuntimeError('Tweet requires status or filename')
 
-    def _convert(self, filename, outname=OUT_FILENAME):
-        if filename == outname:
-            return outname
+    def _load(self, filename):
+        from PIL import Image
 
-        if not self.args or not self.args.magick:
-            raise RuntimeError('No ImageMagick handler registered & it\'s required to convert! Pipeline stopping')
+        with timed(is_verbose(1), 'Loading image...', 'Loaded image in {0:.3f}s'):
+            image = Image.open(filename)
+            image.load()
 
-        with timed(is_verbose(1), 'Converting image...', 'Converted image in {0:.3f}s'):
-            call_args = [
-                self.args.magick, filename, outname
-            ]
-            subprocess.check_call(call_args)
-
-        return outname
+        return image
 
     def _resize(self, filename):
-        if not self.args or not self.args.magick:
-            raise RuntimeError('No ImageMagick handler registered & it\'s required to resize! Pipeline stopping')
+        """Image file small enough to tweet, shrinking `filename` when needed"""
+        if os.path.getsize(filename) <= TWITTER_FILESIZE_LIMIT:
+            return filename
 
-        file_size = os.path.getsize(filename)
-
-        attempt = 0
-        while file_size > TWITTER_FILESIZE_LIMIT and attempt < 5:
-            with timed(is_verbose(1), 'Needs more jpeg...', 'Resized image in {0:.3f}s'):
-                new_filename = JPG_FILENAME.format(attempt)
-                call_args = [
-                    self.args.magick, filename,
-                    '-define', 'jpeg:extent={}'.format(NEW_FILESIZE_LIMIT),
-                ]
-                if attempt > 0:
-                    call_args.extend(['-scale', '70%'])
-                call_args.append(new_filename)
-                subprocess.check_call(call_args)
-                filename = new_filename
-                file_size = os.path.getsize(filename)
-
-        return filename
+        with timed(is_verbose(1), 'Needs more jpeg...', 'Resized image in {0:.3f}s'):
+            return shrink_image(filename, TWITTER_FILESIZE_LIMIT, JPG_FILENAME.format(0))
 
 
 def read_ini_sections(filename):
@@ -217,6 +329,126 @@ def read_ini_sections(filename):
         filename += '.ini'
     with open(filename, 'r') as f:
         data = f.read()
-    import re
     return re.findall('^\[(\w+)\]', data, re.MULTILINE)
 
+
+def read_pov_size(pov_args):
+    """
+    Image (width, height) given by POV-Ray options, looking inside ini files (and their chosen
+    `[section]`) too; None if it can't be found.
+    """
+    options = dict()
+    for arg in pov_args[1:]:
+        ini = re.match(r'^([^+\-].*?)(?:\[(\w+)\])?$', arg)
+        if ini:
+            filename = ini.group(1)
+            if not os.path.exists(filename) and not filename.lower().endswith('.ini'):
+                filename += '.ini'
+            if os.path.exists(filename):
+                options.update(_read_ini_size(filename, ini.group(2)))
+        else:
+            options.update(_read_size_options(arg))
+    if 'W' in options and 'H' in options:
+        return options['W'], options['H']
+    return None
+
+
+def _read_size_options(text):
+    options = dict()
+    for key, value in re.findall(r'(?:^|\s)[+\-]([WH])(\d+)', text):
+        options[key] = int(value)
+    for key, value in re.findall(r'^\s*(Width|Height)\s*=\s*(\d+)', text, re.MULTILINE):
+        options[key[0]] = int(value)
+    return options
+
+
+def _read_ini_size(filename, section=None):
+    options = dict()
+    current = None
+    with open(filename, 'r') as f:
+        for line in f:
+            header = re.match(r'^\s*\[(\w+)\]', line)
+            if header:
+                current = header.group(1)
+            elif current is None or current == section:
+                options.update(_read_size_options(line))
+    return options
+
+
+def stitch_strips(filenames, rows, size, outname):
+    """
+    Stack strips rendered between `rows` into one image.  Strips may be just their rows, or the
+    whole frame with only their rows rendered.
+    """
+    from PIL import Image
+
+    image = Image.new('RGB', size)
+    for filename, top, bottom in zip(filenames, rows, rows[1:]):
+        strip = Image.open(filename).convert('RGB')
+        if strip.size[1] == size[1] and bottom - top != size[1]:
+            strip = strip.crop((0, top, size[0], bottom))
+        image.paste(strip, (0, top))
+    image.save(outname)
+    return outname
+
+
+def save_image_within(image, limit, outname, jpeg_outname):
+    """
+    Save the loaded PIL image as the PNG `outname` if that's at most `limit` bytes, and otherwise
+    only as a JPEG `jpeg_outname` shrunk to fit (see `shrink_image`); returns the filename written.
+    The PNG is encoded in memory, so it's never written just to be thrown away.
+    """
+    f = io.BytesIO()
+    image.save(f, 'PNG')
+    if f.tell() <= limit:
+        with open(outname, 'wb') as out:
+            out.write(f.getvalue())
+        return outname
+    return shrink_image(image, limit, jpeg_outname)
+
+
+def shrink_image(image, limit, outname, attempts=5):
+    """
+    Save the image (a filename or PIL image) as a JPEG of at most `limit` bytes: the best quality that fits, found by
+    binary search in memory, scaling the image down by `JPEG_SCALE` whenever even the lowest
+    quality is too big.  Only the result is written out.
+    """
+    from PIL import Image
+
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    data = None
+    for attempt in range(attempts):
+        if attempt > 0:
+            size = tuple(max(1, int(round(n * JPEG_SCALE ** attempt))) for n in image.size)
+            scaled = image.resize(size, Image.BILINEAR)
+        else:
+            scaled = image
+
+        low, high = JPEG_QUALITY
+        while low <= high:
+            quality = (low + high) // 2
+            encoded = _encode_jpeg(scaled, quality)
+            if len(encoded) <= limit:
+                data = encoded
+                low = quality + 1
+            else:
+                high = quality - 1
+        if data is not None:
+            break
+    else:
+        # Nothing fit, settle for the smallest we've got
+        data = _encode_jpeg(scaled, JPEG_QUALITY[0])
+
+    with open(outname, 'wb') as f:
+        f.write(data)
+    return outname
+
+
+def _encode_jpeg(image, quality):
+    f = io.BytesIO()
+    image.save(f, 'JPEG', quality=quality)
+    return f.getvalue()
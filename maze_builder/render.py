@@ -0,0 +1,92 @@
+"""
+Queue of renderer processes (POV-Ray, YafaRay...), run a few at a time in the background.
+
+Each job remembers the directory it was submitted from and runs there, and its post-processing
+step (`then`) is run back on the submitting thread once it's finished -- again in that
+directory -- so the rest of the program can carry on generating mazes in the meantime.
+"""
+from concurrent import futures
+import subprocess
+from .util import clock, is_verbose, working_directory
+import os
+
+
+class RenderJob(object):
+    def __init__(self, name, args, cwd, then=None):
+        self.name = name
+        self.args = args
+        self.cwd = cwd
+        self.then = then
+        self.returncode = None
+        self.started = self.finished = None
+
+    @property
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def run(self):
+        self.started = clock()
+        try:
+            self.returncode = subprocess.call(self.args, cwd=self.cwd)
+        finally:
+            self.finished = clock()
+        return self
+
+    def __repr__(self):
+        return 'RenderJob({!r}, {!r}, returncode={})'.format(self.name, self.cwd, self.returncode)
+
+
+class RenderQueue(object):
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.jobs = list()
+        self.failures = list()
+        self._executor = None
+        self._pending = list()
+
+    def submit(self, name, args, then=None):
+        """Start rendering with `args` once a worker is free, then call `then(job)` when finished"""
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(self.workers)
+        job = RenderJob(name, args, os.getcwd(), then)
+        self._pending.append(self._executor.submit(job.run))
+        self.finish(wait=False)
+        return job
+
+    def finish(self, wait=True):
+        """
+        Post-process jobs which have finished; with `wait`, wait for every job and raise if any
+        of them failed.
+        """
+        if self._pending:
+            done, pending = futures.wait(self._pending, timeout=None if wait else 0)
+            self._pending = [future for future in self._pending if future in pending]
+            for future in done:
+                self._complete(future.result())
+
+        if wait:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            if self.failures:
+                job = self.failures[0]
+                self.failures = list()
+                raise subprocess.CalledProcessError(job.returncode, job.args)
+
+    def summary(self):
+        elapsed = [job.elapsed for job in self.jobs if job.elapsed is not None]
+        return '{} renders ({} failed) taking {:.3f}s in all'.format(
+            len(self.jobs), sum(1 for job in self.jobs if job.returncode), sum(elapsed))
+
+    def _complete(self, job):
+        self.jobs.append(job)
+        if is_verbose(1):
+            print('{} finished in {:.3f}s with exit status {} ({})'.format(
+                job.name, job.elapsed, job.returncode, job.cwd))
+        if job.returncode:
+            self.failures.append(job)
+        elif job.then is not None:
+            with working_directory(job.cwd):
+                job.then(job)
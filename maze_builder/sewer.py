@@ -138,6 +138,14 @@ class Choice(Selector):
         else:
             raise RuntimeError('Choice is empty')
 
+    def distribution(self, tag=None):
+        """The choices for `tag`, and the probability of each being picked"""
+        tag = tag or self.DEFAULT
+        total = self.totals.get(tag, 0)
+        if not total:
+            raise RuntimeError('Choice is empty')
+        return self.choices, [weight.get(tag, 0) / total for weight in self.weights]
+
     @classmethod
     def __build_choices_and_weights(cls, choices=(), **extras):
         if isinstance(choices, collections.Mapping):
@@ -0,0 +1,38 @@
+"""
+Jinja2 templates from package resources, shared so each is only compiled once.
+
+Each resource package gets one environment, which compiles templates to bytecode cached on disk
+(so new processes skip parsing too), and compiled templates are kept in memory by name.
+"""
+import functools
+import jinja2
+
+
+# Number of rendered pieces gathered up per write when streaming
+STREAM_BUFFER = 256
+
+
+@functools.lru_cache(maxsize=None)
+def environment(package):
+    """Environment loading templates from the `package` resource package"""
+    return jinja2.Environment(
+        loader=jinja2.PackageLoader(package, ''),
+        bytecode_cache=jinja2.FileSystemBytecodeCache(),
+        auto_reload=False,
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def get_template(package, template_name):
+    return environment(package).get_template(template_name)
+
+
+def render(package, template_name, **kwargs):
+    return get_template(package, template_name).render(**kwargs)
+
+
+def dump(fp, package, template_name, **kwargs):
+    """Render straight into the file `fp` a chunk at a time, rather than building one string"""
+    stream = get_template(package, template_name).stream(**kwargs)
+    stream.enable_buffering(STREAM_BUFFER)
+    stream.dump(fp)
@@ -1,4 +1,8 @@
+import builtins
 import contextlib
+import importlib.util
+import os
+import sys
 import time
 
 
@@ -32,3 +36,54 @@ def timed(verbose, start_text=None, stop_text=None):
     elapsed = clock() - started
     if verbose and stop_text:
         print(stop_text.format(elapsed))
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    """Run with `path` (made if needed) as the current directory"""
+    os.makedirs(path, exist_ok=True)
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+
+
+@contextlib.contextmanager
+def import_times():
+    """
+    Record how long each module takes to import for the first time, including the modules it
+    imports in turn; yields a dict of module name -> seconds, filled in as they're imported.
+    """
+    times = dict()
+    original_import = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        package = (globals or {}).get('__package__')
+        if level and not package:
+            return original_import(name, globals, locals, fromlist, level)
+        elif level:
+            name, level = importlib.util.resolve_name('.' * level + name, package), 0
+        if name in sys.modules or name in times:
+            return original_import(name, globals, locals, fromlist, level)
+        times[name] = None
+        started = clock()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            times[name] = clock() - started
+
+    builtins.__import__ = timed_import
+    try:
+        yield times
+    finally:
+        builtins.__import__ = original_import
+
+
+def print_import_times(times, elapsed, limit=30):
+    imported = sorted(((t, name) for name, t in times.items() if t is not None), reverse=True)
+    print('Imported {} modules while running for {:.3f}s; slowest (including their imports):'.format(
+        len(imported), elapsed))
+    for t, name in imported[:limit]:
+        print('{:10.3f}s  {}'.format(t, name))
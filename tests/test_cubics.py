@@ -0,0 +1,146 @@
+import unittest
+import io
+import numpy
+from PIL import Image, ImageChops
+from maze_builder.cubics.cubic import DenseCubic, GridRoom, Room, PLUS_X, PLUS_Y, MINUS_X, MINUS_Y, stream_exit_rows
+from maze_builder.cubics.vectorized import spanning_tree, grid_edges, grid_strides
+from maze_builder.mazes.equivalence import DisjointSets
+from maze_builder.mazes.algorithms import ALGORITHMS, eller_rows
+from maze_builder.pngwriter import PngWriter
+from maze_builder.cubics.illustrators.imaging import ImageBlockIllustrator
+from maze_builder.cubics.builders import BLENDS, ImageBuilderCombined
+import os
+import random
+import tempfile
+
+
+class TestDenseCubic(unittest.TestCase):
+    def test_fill_spans(self):
+        cubic = DenseCubic().prepare(4, 3, 2, origin=(-2, -1, 0)).fill()
+        self.assertEqual(len(cubic.rooms), 24)
+        self.assertEqual(sum(bin(exits).count('1') for exits in cubic.exits), 2 * 23)
+        self.assertEqual(len(cubic.topology.active_routes), 23)
+        self.assertEqual(len(cubic.topology.known_routes), 3*3*2 + 4*2*2 + 4*3)
+
+    def test_rooms(self):
+        cubic = DenseCubic().prepare(3, 3, origin=(-1, -1, 0))
+        room = cubic.get_room((1, 0))
+        self.assertIsInstance(room, GridRoom)
+        self.assertEqual(room.coords(), (1, 0, 0))
+        self.assertEqual(room, cubic.rooms[(1, 0, 0)])
+        self.assertIsNone(cubic.get_room((2, 0), make=False))
+        self.assertRaises(RuntimeError, cubic.get_room, (2, 0))
+        self.assertEqual(len({room, Room(1, 0, 0), cubic.get_room((1, 0))}), 1)
+
+    def test_origin(self):
+        self.assertEqual(DenseCubic().prepare(2, 2, origin=(1.0, -2, 0)).minx, 1)
+        self.assertRaises(RuntimeError, DenseCubic().prepare, 2, 2, 1, (0.5, 0, 0))
+
+    def test_offer_route(self):
+        cubic = DenseCubic().prepare(2, 1)
+        self.assertTrue(cubic.offer_route(cubic.make_route([(1, 0), (0, 0)])))
+        self.assertFalse(cubic.offer_route(cubic.make_route([(0, 0), (1, 0)])))
+        self.assertEqual(list(cubic.exits), [PLUS_X, MINUS_X])
+        self.assertTrue(cubic.any_active_route_connecting((0, 0), (1, 0)))
+
+
+class TestSpanningTree(unittest.TestCase):
+    def test_matches_kruskal(self):
+        shape = (2, 3, 4)
+        exits, labels = spanning_tree(shape, random_state=numpy.random.RandomState(7))
+
+        # Kruskal over the same edge order
+        rooms, directions = grid_edges(shape)
+        strides = grid_strides(shape)
+        sets = DisjointSets()
+        sets.grow(24)
+        expected = numpy.zeros(24, dtype=numpy.uint8)
+        for edge in numpy.random.RandomState(7).permutation(len(rooms)):
+            room, direction = int(rooms[edge]), int(directions[edge])
+            other = room + int(strides[direction])
+            if sets.find(room) != sets.find(other):
+                sets.union(room, other)
+                expected[room] |= 1 << direction
+                expected[other] |= 1 << (direction + 3)
+
+        self.assertEqual(exits.tolist(), expected.tolist())
+        self.assertEqual(set(labels.tolist()), {0})
+
+
+class TestAlgorithms(unittest.TestCase):
+    def test_spanning(self):
+        for name in ALGORITHMS:
+            with self.subTest(algorithm=name):
+                cubic = DenseCubic().prepare(6, 5).generate(name)
+                self.assertEqual(sum(bin(exits).count('1') for exits in cubic.exits), 2 * 29)
+                self.assertEqual(len(cubic.topology.spaces(cubic.rooms.values())), 1)
+
+    def test_eller_rows(self):
+        rows = list(eller_rows(8, 4))
+        self.assertEqual(len(rows), 4)
+        self.assertFalse(any(rows[-1][1]))
+        self.assertEqual(sum(sum(east) + sum(south) for east, south in rows), 8 * 4 - 1)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_exit_rows(self):
+        rows = list(stream_exit_rows(7, 5))
+        for j, row in enumerate(rows):
+            for i, exits in enumerate(row):
+                self.assertEqual(bool(exits & PLUS_X), i + 1 < 7 and bool(row[i+1] & MINUS_X))
+                self.assertEqual(bool(exits & PLUS_Y), j + 1 < 5 and bool(rows[j+1][i] & MINUS_Y))
+        self.assertEqual(sum(bin(exits).count('1') for row in rows for exits in row), 2 * 34)
+
+    def test_png_writer(self):
+        f = io.BytesIO()
+        with PngWriter(f, 3) as png:
+            for j in range(4):
+                png.write_row(bytes([j, 10, 20] * 3))
+        f.seek(0)
+        image = Image.open(f)
+        self.assertEqual(image.size, (3, 4))
+        self.assertEqual(image.getpixel((2, 3)), (3, 10, 20))
+
+
+class TestImageBlockIllustrator(unittest.TestCase):
+    def test_matches_rows(self):
+        cubic = DenseCubic().prepare(6, 4).fill()
+        illustrator = ImageBlockIllustrator()
+        image = illustrator.draw(cubic)
+        self.assertEqual(image.size, (13, 9))
+        pixels = [image.getpixel((i, j)) for j in range(9) for i in range(13)]
+        self.assertEqual(pixels, sum(illustrator.draw_rows(cubic.exit_map(), 6), []))
+
+
+class TestBlends(unittest.TestCase):
+    def test_match_image_chops(self):
+        image0 = numpy.arange(256, dtype=numpy.uint8).repeat(256).reshape(256, 256)
+        image1 = image0.T.copy()
+        for name, blend in BLENDS.items():
+            with self.subTest(blend=name):
+                expected = getattr(ImageChops, name)(Image.fromarray(image0), Image.fromarray(image1))
+                self.assertTrue(numpy.array_equal(blend(image0, image1), numpy.asarray(expected)))
+
+
+class TestImageBuilderCombined(unittest.TestCase):
+    def test_keeps_random_state(self):
+        builder = ImageBuilderCombined(21, 21, [ImageBlockIllustrator()] * 2, workers=1)
+        random.seed(3)
+        with tempfile.TemporaryDirectory() as directory:
+            builder.build(None, filename=os.path.join(directory, 'out.png'))
+        after = random.random()
+
+        # Just the layers' seeds are drawn
+        random.seed(3)
+        random.getrandbits(32)
+        random.getrandbits(32)
+        self.assertEqual(after, random.random())
+
+    def test_count_workers(self):
+        illustrators = [ImageBlockIllustrator()] * 3
+        self.assertEqual(ImageBuilderCombined(512, 512, illustrators).count_workers(), 1)
+        self.assertEqual(ImageBuilderCombined(512, 512, illustrators, workers=2, pool_pixels=0).count_workers(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
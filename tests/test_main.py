@@ -0,0 +1,53 @@
+import unittest
+import random
+import subprocess
+import sys
+import tempfile
+from maze_builder.main import DEFAULTS, make_builders, _warn_deprecated
+from maze_builder.util import working_directory
+
+
+def builder(name, **args):
+    builders = make_builders(DEFAULTS._replace(**args))
+    return next(selector for selector, n in builders.items() if n == name)()
+
+
+class TestMakeBuilders(unittest.TestCase):
+    def test_algorithm(self):
+        self.assertEqual(builder('bw2d', algorithm='wilson').algorithm, 'wilson')
+        self.assertEqual(builder('borg', algorithm='wilson').algorithm, 'wilson')
+        self.assertIsNone(builder('bw2dtilt').algorithm)
+
+    def test_simplify(self):
+        class Processor(object):
+            def process_obj(self, filename):
+                with open(filename) as f:
+                    self.faces = sum(line.startswith('f ') for line in f)
+
+        faces = list()
+        for simplify in (None, 0.5):
+            processor = Processor()
+            with tempfile.TemporaryDirectory() as root, working_directory(root):
+                random.seed(2)
+                builder('objtest', simplify=simplify).build(processor)
+            faces.append(processor.faces)
+        self.assertLess(faces[1], faces[0])
+
+    def test_lazy(self):
+        # In a fresh interpreter, as other tests have imported everything here
+        script = 'import sys, maze_builder.main as m; m.make_builders(m.DEFAULTS); print(*sys.modules)'
+        modules = set(subprocess.check_output([sys.executable, '-c', script]).decode().split())
+        self.assertIn('maze_builder.main', modules)
+        for module in ('maze_builder.processor', 'maze_builder.render', 'maze_builder.cubics.builders',
+                       'subprocess', 'multiprocessing', 'concurrent.futures', 'numpy', 'PIL'):
+            self.assertNotIn(module, modules)
+
+
+class TestDeprecated(unittest.TestCase):
+    def test_magick(self):
+        with self.assertWarns(UserWarning):
+            _warn_deprecated(DEFAULTS._replace(magick='convert'))
+
+
+if __name__ == '__main__':
+    unittest.main()
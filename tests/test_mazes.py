@@ -0,0 +1,45 @@
+import unittest
+from maze_builder.mazes.equivalence import DisjointSets, EquivalenceSets
+from maze_builder.mazes.maze import Topology, Route
+
+
+class TestDisjointSets(unittest.TestCase):
+    def test_union_find(self):
+        sets = DisjointSets('abcde')
+        self.assertEqual(len(sets), 5)
+        a, b, c, d, e = (sets.index(value) for value in 'abcde')
+
+        sets.union(a, b)
+        sets.union(c, d)
+        self.assertEqual(sets.find(a), sets.find(b))
+        self.assertNotEqual(sets.find(a), sets.find(c))
+
+        sets.union(b, d)
+        self.assertEqual(len({sets.find(i) for i in (a, b, c, d)}), 1)
+        self.assertNotEqual(sets.find(a), sets.find(e))
+
+    def test_grow(self):
+        sets = DisjointSets()
+        self.assertEqual(sets.grow(3), 0)
+        self.assertEqual(sets.grow(2), 3)
+        self.assertEqual([sets.find(i) for i in range(5)], list(range(5)))
+
+
+class TestTopology(unittest.TestCase):
+    def _check_spanning_tree(self, topology, rooms):
+        for i in range(len(rooms) - 1):
+            topology.offer(Route((rooms[i], rooms[i+1])))
+        # Closing the loop must be refused
+        self.assertEqual(topology.offer(Route((rooms[-1], rooms[0]))), ())
+        self.assertEqual(len(topology.active_routes), len(rooms) - 1)
+        self.assertEqual(len(topology.spaces(rooms)), 1)
+
+    def test_disjoint_sets(self):
+        self._check_spanning_tree(Topology(), list(range(10)))
+
+    def test_equivalence_sets(self):
+        self._check_spanning_tree(Topology(spaces=EquivalenceSets()), list(range(10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
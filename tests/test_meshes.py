@@ -0,0 +1,245 @@
+import unittest
+import io
+import numpy
+import noise
+from maze_builder.meshes import perlin
+from maze_builder.meshes.mesh import MeshBuilder, ArrayMeshBuilder
+from maze_builder.meshes.obj import ObjDumper, dump_obj
+from maze_builder.meshes.ply import dump_ply
+from maze_builder.meshes.simplify import simplify_mesh
+from maze_builder.meshes.yafaray import Element, insert_mesh, dump_yafaray, base_scene
+from maze_builder.meshes.scene import Scene, Color
+import os
+import tempfile
+import xmlwitch
+from maze_builder.cubics.illustrators.mesh import Warper2D, Mesher2D
+from maze_builder.cubics.cubic import DenseCubic
+
+
+def triangles(mesh):
+    return sorted(tuple(mesh.get_vertex(v) for v in face.vertices) for face in mesh.iter_faces())
+
+
+class TestMesher2D(unittest.TestCase):
+    def test_lattice_matches_rooms(self):
+        cubic = DenseCubic().prepare(4, 3, origin=(-2, 1, 0)).fill()
+        for density in (1, 2):
+            with self.subTest(density=density):
+                lattice = Mesher2D(wall=0.35, density=density).draw(cubic)
+                rooms = Mesher2D(wall=0.35, density=density, mesh_class=MeshBuilder).draw(cubic)
+                self.assertEqual(triangles(lattice), triangles(rooms))
+                self.assertEqual(len(set(lattice.vertices)), lattice.count_vertices())
+
+
+class TestSimplify(unittest.TestCase):
+    @staticmethod
+    def areas(mesh):
+        vertices, faces = mesh.vertex_array(), mesh.face_array()
+        a = vertices[faces[:, 0]]
+        return numpy.cross(vertices[faces[:, 1]] - a, vertices[faces[:, 2]] - a) / 2
+
+    def test_flat_rectangle(self):
+        mesh = ArrayMeshBuilder().rectangle(((0, 0, 0), (3, 0, 0), (0, 2, 1)), density=4)
+        simplified = simplify_mesh(mesh)
+        self.assertEqual(simplified.count_faces(), 2)
+        self.assertTrue(numpy.allclose(self.areas(simplified).sum(axis=0), self.areas(mesh).sum(axis=0)))
+
+        # Curved, nothing is within no tolerance
+        mesh.perform_array_warp(TestArrayMeshBuilder.shear)
+        self.assertEqual(simplify_mesh(mesh).count_faces(), mesh.count_faces())
+        self.assertLess(simplify_mesh(mesh, 0.5).count_faces(), mesh.count_faces())
+
+    def test_maze(self):
+        cubic = DenseCubic().prepare(5, 4).fill()
+        mesh = Mesher2D(wall=0.35, density=2).draw(cubic)
+        simplified = simplify_mesh(mesh)
+        self.assertLess(simplified.count_faces(), Mesher2D(wall=0.35).draw(cubic).count_faces())
+
+        # Same surface: each face facing the same way, & edges still shared by two faces
+        self.assertTrue(numpy.allclose(
+            numpy.abs(self.areas(simplified)).sum(axis=0), numpy.abs(self.areas(mesh)).sum(axis=0)))
+        edges = numpy.sort(simplified.face_array()[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        _, counts = numpy.unique(edges[:, 0] * simplified.count_vertices() + edges[:, 1], return_counts=True)
+        self.assertEqual(set(counts.tolist()) - {1}, {2})
+
+    def test_materials(self):
+        mesh = ArrayMeshBuilder()
+        mesh.rectangle(((0, 0, 0), (2, 0, 0), (0, 2, 0)), density=4)
+        mesh.update_attributes(default_material='stone')
+        mesh.rectangle(((2, 0, 0), (4, 0, 0), (2, 2, 0)), density=4)
+        mesh.update_attributes(default_material=None)
+        simplified = simplify_mesh(mesh)
+        self.assertLess(simplified.count_faces(), mesh.count_faces())
+        self.assertEqual([material for _, _, material in simplified.material_runs()], [None, 'stone'])
+        # The border between them is still shared
+        self.assertEqual(len(set(simplified.vertices)), simplified.count_vertices())
+
+
+class TestPerlin(unittest.TestCase):
+    def test_matches_noise(self):
+        random_state = numpy.random.RandomState(5)
+        xs = random_state.uniform(-20, 1100, 500)
+        ys = random_state.uniform(-20, 1100, 500)
+        for octaves in (1, 3):
+            with self.subTest(octaves=octaves):
+                expected = [noise.pnoise2(x, y, octaves) for x, y in zip(xs.tolist(), ys.tolist())]
+                self.assertEqual(perlin.pnoise2(xs, ys, octaves).tolist(), expected)
+
+
+class TestWarper2D(unittest.TestCase):
+    def test_matches_vertex_warp(self):
+        meshes = [MeshBuilder().rectangle(((0, 0, 0), (3, 0, 0), (0, 2, 1)), density=4) for _ in range(3)]
+
+        def warp(v):
+            x, y, z = v
+            return x, y, z + 2 * 0.5 * noise.pnoise2(10 + x / 0.5, 20 + y / 0.5, 3)
+
+        meshes[0].vertices.warp(warp)
+        Warper2D(perlin.pnoise2, (3,), 0.5, 2, (10, 20))(meshes[1])
+        self.assertEqual(list(meshes[1].vertices), list(meshes[0].vertices))
+        Warper2D(noise.pnoise2, (3,), 0.5, 2, (10, 20))(meshes[2])
+        self.assertEqual(list(meshes[2].vertices), list(meshes[0].vertices))
+        self.assertEqual(meshes[1].get_vertex(meshes[1].enter_vertex(meshes[1].get_vertex(5))), meshes[1].get_vertex(5))
+        self.assertFalse(Warper2D(lambda x, y, octaves: perlin.pnoise2(x, y, octaves)).vectorized)
+        self.assertTrue(Warper2D(perlin.pnoise2).vectorized)
+
+    def test_vectorized_errors_raise(self):
+        def broken(xs, ys):
+            raise TypeError('Not a missing scalar fallback')
+
+        mesh = MeshBuilder().rectangle(((0, 0, 0), (1, 0, 0), (0, 1, 0)))
+        self.assertRaises(TypeError, Warper2D(broken, vectorized=True), mesh)
+
+
+class TestArrayMeshBuilder(unittest.TestCase):
+    @staticmethod
+    def shear(vertices):
+        vertices[:, 2] += vertices[:, 0] * vertices[:, 1]
+
+    def test_matches_mesh_builder(self):
+        meshes = [cls(index_base=1) for cls in (MeshBuilder, ArrayMeshBuilder)]
+        for mesh in meshes:
+            mesh.rectangle(((0, 0, 0), (1, 0, 0), (0, 2, 0)), density=3)
+            mesh.triangle(((0, 0, 0), (1, 0, 0), (0, 0, 0.5)), density=2)
+            mesh.perform_array_warp(self.shear)
+        faces = [[tuple(mesh.get_vertex(v) for v in face.vertices) for face in mesh.iter_faces()] for mesh in meshes]
+        self.assertEqual(faces[1], faces[0])
+        self.assertEqual(meshes[1].faces.array.dtype, numpy.int32)
+        self.assertLessEqual(meshes[1].count_vertices(), meshes[0].count_vertices())
+
+    def test_faces(self):
+        mesh = ArrayMeshBuilder()
+        mesh.enter_face([(0, 0, 0), (1, 0, 0), (0, 1, 0)])
+        mesh.enter_face([(1, 0, 0), (1, 1, 0), (0, 1, 0)], [(0, 0), (1, 0), (0, 1)], material='stone')
+        self.assertEqual(mesh.count_vertices(), 4)
+        self.assertEqual(mesh.get_face(0), ((0, 1, 2), None, None, None))
+        self.assertEqual(mesh.get_face(1), ((1, 3, 2), (0, 1, 2), None, 'stone'))
+        self.assertRaises(RuntimeError, mesh.enter_face, [0, 1, 2, 3])
+
+        mesh.perform_warp(lambda v: (v[0], v[1], v[2] + 1))
+        self.assertEqual(mesh.get_vertex(3), (1, 1, 1))
+        self.assertEqual(mesh.enter_vertex((0, 1, 1)), 2)
+
+    def test_vertex_lookup(self):
+        mesh = ArrayMeshBuilder()
+        # Tuples with the same hash, as hash(-1) == hash(-2)
+        self.assertEqual([mesh.enter_vertex(v) for v in [(-1, 0, 0), (-2, 0, 0), (-1, 0, 0)]], [0, 1, 0])
+        mesh.replace_vertex(0, (5, 5, 5))
+        self.assertEqual(mesh.enter_vertex((5, 5, 5)), 0)
+        self.assertEqual(mesh.enter_vertex((-1, 0, 0)), 2)
+        self.assertEqual(mesh.count_vertices(), 3)
+
+
+class TestFindLimits(unittest.TestCase):
+    def test_height_grid(self):
+        random_state = numpy.random.RandomState(11)
+        mesh = ArrayMeshBuilder()
+        for vertex in random_state.uniform(-5, 5, (2000, 3)).tolist():
+            mesh.enter_vertex(vertex)
+        vertices = list(mesh.vertices)
+        grid = mesh.height_grid()
+        for xbounds, ybounds in [((-1, 1), (-1, 1)), ((0.5, 3.2), (-4.9, -2)), ((-9, 9), (2, 2.1)), ((6, 7), (0, 1))]:
+            with self.subTest(xbounds=xbounds, ybounds=ybounds):
+                zs = [z for x, y, z in vertices if xbounds[0] <= x <= xbounds[1] and ybounds[0] <= y <= ybounds[1]]
+                expected = (min(zs), max(zs)) if zs else (float('inf'), -float('inf'))
+                self.assertEqual(mesh.find_limits((0, 0, 1), xbounds, ybounds), expected)
+                self.assertEqual(grid.find_limits(xbounds, ybounds), expected)
+
+
+class TestExport(unittest.TestCase):
+    def mesh(self, cls):
+        mesh = cls()
+        mesh.rectangle(((0, 0, 0), (1, 0, 0.25), (0, 1, 0)), density=2)
+        mesh.enter_face([(2, 0, 0), (3, 0, 0), (2, 1, 0)], material='stone')
+        mesh.enter_face([(3, 0, 0), (3, 1, 0), (2, 1, 0)], material='stone')
+        mesh.enter_face([(0, 0, 0), (2, 0, 0), (0, 1, 0)])
+        return mesh
+
+    def test_obj_lines(self):
+        for cls in (MeshBuilder, ArrayMeshBuilder):
+            with self.subTest(mesh=cls.__name__):
+                mesh = self.mesh(cls)
+                dumper = ObjDumper()
+                expected = io.StringIO()
+                for _, vertex in mesh.iter_vertices():
+                    dumper.write(expected, 'v', *vertex)
+                material = None
+                for face in mesh.iter_faces():
+                    if face.material and face.material != material:
+                        dumper.write(expected, 'usemtl', face.material)
+                        material = face.material
+                    dumper.write(expected, 'f', *(v + 1 for v in face.vertices))
+                self.assertEqual(dump_obj(None, mesh), expected.getvalue())
+
+    def test_ply(self):
+        mesh = self.mesh(ArrayMeshBuilder)
+        f = io.BytesIO()
+        dump_ply(f, mesh)
+        header, data = f.getvalue().split(b'end_header\n')
+        self.assertIn('element vertex {}'.format(mesh.count_vertices()).encode(), header)
+        vertices = numpy.frombuffer(data, dtype='<f4', count=3 * mesh.count_vertices()).reshape(-1, 3)
+        faces = numpy.frombuffer(data[vertices.nbytes:], dtype=[('count', 'u1'), ('vertices', '<i4', (3,))])
+        self.assertEqual(vertices.tolist(), mesh.vertex_array().tolist())
+        self.assertEqual(faces['vertices'].tolist(), mesh.face_array().tolist())
+        self.assertEqual(set(faces['count'].tolist()), {3})
+
+
+class TestYafaray(unittest.TestCase):
+    def test_mesh_lines(self):
+        mesh = ArrayMeshBuilder(smoothing_degrees=30)
+        mesh.enter_face([(0, 0, 0), (1, 0, 0), (0, 1, 0.5)])
+        mesh.enter_face([(1, 0, 0), (1, 1, 0), (0, 1, 0.5)], material='stone')
+        root = Element('scene')
+        insert_mesh(root, mesh, {None: 'defaultMat', 'stone': 'stoneMat'})
+        f = io.BytesIO()
+        root.write(xmlwitch.Builder(stream=f))
+        self.assertEqual(f.getvalue().decode().splitlines(), [
+            '<scene>',
+            '  <mesh faces="2" has_orco="false" has_uv="false" id="1" obj_pass_index="0" type="0" vertices="4">',
+            '    <p x="0.0" y="0.0" z="0.0" />',
+            '    <p x="1.0" y="0.0" z="0.0" />',
+            '    <p x="0.0" y="1.0" z="0.5" />',
+            '    <p x="1.0" y="1.0" z="0.0" />',
+            '    <set_material sval="defaultMat" />',
+            '    <f a="0" b="1" c="2" />',
+            '    <set_material sval="stoneMat" />',
+            '    <f a="1" b="3" c="2" />',
+            '  </mesh>',
+            '  <smooth ID="1" angle="30" />',
+            '</scene>',
+        ])
+
+    def test_base_scene_shared(self):
+        xml = '<scene><background name="bg"><color r="0" g="0" b="0" a="1"/></background><light name="l"/></scene>'
+        with tempfile.TemporaryDirectory() as root:
+            filename = os.path.join(root, 'out.xml')
+            for i in range(2):
+                dump_yafaray(filename, xml, Scene().set_background(Color(i, i, i)))
+                with open(filename) as f:
+                    self.assertEqual(f.read().count('<color'), 1)
+        self.assertEqual(base_scene(xml).find('background').find('color').attrib['r'], '0')
+        self.assertEqual(len(base_scene(xml).findall('light')), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
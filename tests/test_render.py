@@ -0,0 +1,111 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import Namespace
+from PIL import Image
+from maze_builder.render import RenderQueue
+import numpy
+from maze_builder.processor import Processor, read_pov_size, stitch_strips, shrink_image, save_image_within
+from maze_builder.sewer import Selector
+from maze_builder.util import working_directory
+
+
+class TestRenderQueue(unittest.TestCase):
+    def test_then_runs_in_job_directory(self):
+        queue = RenderQueue(2)
+        finished = list()
+        with tempfile.TemporaryDirectory() as root:
+            for name in 'ab':
+                with working_directory(os.path.join(root, name)):
+                    queue.submit(name, [sys.executable, '-c', 'open("out.txt", "w").write("done")'],
+                                 lambda job: finished.append((job.name, open('out.txt').read())))
+            queue.finish()
+        self.assertEqual(sorted(finished), [('a', 'done'), ('b', 'done')])
+        self.assertEqual([job.returncode for job in queue.jobs], [0, 0])
+
+    def test_failure_raises(self):
+        queue = RenderQueue(2)
+        queue.submit('fail', [sys.executable, '-c', 'raise SystemExit(3)'], lambda job: self.fail())
+        self.assertRaises(subprocess.CalledProcessError, queue.finish)
+
+
+class NumberBuilder(object):
+    def __init__(self, made):
+        made.append(self)
+
+    def build(self, processor, verbose=0):
+        with open('out.txt', 'w') as f:
+            f.write(os.path.basename(os.getcwd()))
+
+
+class TestBatch(unittest.TestCase):
+    def test_numbered_directories(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers), tempfile.TemporaryDirectory() as root:
+                made = list()
+                processor = Processor(
+                    {Selector.bless(lambda: NumberBuilder(made)): 'numbers'},
+                    args=Namespace(verbose=0, builder='numbers', count=11, out_dir=root, workers=workers),
+                )
+                directories = processor.batch()
+                self.assertEqual(directories, [os.path.join(root, '{:02d}'.format(i)) for i in range(11)])
+                for directory in directories:
+                    with open(os.path.join(directory, 'out.txt')) as f:
+                        self.assertEqual(f.read(), os.path.basename(directory))
+                # Forked workers each made their own
+                self.assertEqual(len(made), 1 if workers == 1 else 0)
+
+
+class TestStrips(unittest.TestCase):
+    def test_read_pov_size(self):
+        with tempfile.TemporaryDirectory() as root, working_directory(root):
+            with open('scene.ini', 'w') as f:
+                f.write('Width=640\nHeight=480\n[wide]\n+A +W1024 +H512\n[tall]\n+H900\n')
+            self.assertEqual(read_pov_size(['povray', 'scene.ini']), (640, 480))
+            self.assertEqual(read_pov_size(['povray', 'scene[wide]']), (1024, 512))
+            self.assertEqual(read_pov_size(['povray', 'scene.ini[tall]', '+W300']), (300, 900))
+            self.assertIsNone(read_pov_size(['povray', '+W300']))
+
+    def test_stitch_strips(self):
+        rows = [0, 2, 5]
+        with tempfile.TemporaryDirectory() as root, working_directory(root):
+            # POV-Ray may write just the strip, or the whole frame around it
+            Image.new('RGB', (4, 2), (255, 0, 0)).save('a.png')
+            Image.new('RGB', (4, 5), (0, 0, 255)).save('b.png')
+            stitch_strips(['a.png', 'b.png'], rows, (4, 5), 'out.png')
+            image = Image.open('out.png')
+            self.assertEqual(image.size, (4, 5))
+            self.assertEqual([image.getpixel((0, j)) for j in range(5)], [(255, 0, 0)] * 2 + [(0, 0, 255)] * 3)
+
+
+class TestShrinkImage(unittest.TestCase):
+    def test_fits_limit(self):
+        noise = numpy.random.RandomState(3).randint(0, 256, (300, 400, 3)).astype(numpy.uint8)
+        with tempfile.TemporaryDirectory() as root, working_directory(root):
+            Image.fromarray(noise).save('in.png')
+            for limit in (100000, 20000):
+                with self.subTest(limit=limit):
+                    shrink_image('in.png', limit, 'out.jpg')
+                    self.assertLessEqual(os.path.getsize('out.jpg'), limit)
+            self.assertLess(Image.open('out.jpg').size, (400, 300))
+
+    def test_loaded_image(self):
+        image = Image.new('RGBA', (40, 30), (10, 20, 30, 255))
+        with tempfile.TemporaryDirectory() as root, working_directory(root):
+            self.assertEqual(shrink_image(image, 10000, 'out.jpg'), 'out.jpg')
+            self.assertEqual(Image.open('out.jpg').size, (40, 30))
+
+    def test_save_within(self):
+        noise = Image.fromarray(numpy.random.RandomState(3).randint(0, 256, (300, 400, 3)).astype(numpy.uint8))
+        with tempfile.TemporaryDirectory() as root, working_directory(root):
+            self.assertEqual(save_image_within(noise, 10**6, 'out.png', 'out.jpg'), 'out.png')
+            self.assertFalse(os.path.exists('out.jpg'))
+            os.remove('out.png')
+            self.assertEqual(save_image_within(noise, 20000, 'out.png', 'out.jpg'), 'out.jpg')
+            self.assertFalse(os.path.exists('out.png'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import io
+import random
+from maze_builder import templates
+from maze_builder.castles.castle import CastleTwoLevel
+from maze_builder.castles.illustrators import RESOURCE_PACKAGE, resource, template, TemplateIllustrator, merge_runs
+
+
+class TestTemplates(unittest.TestCase):
+    def test_matches_source(self):
+        kwargs = dict(walls=[('MakeWallX', (1, 2, 0), 1)], features=[('MakeSpire', (1, 1, 0), (2,))], seed=5)
+        source = resource('pure.pov.jinja2')
+        expected = templates.environment(RESOURCE_PACKAGE).from_string(source).render(**kwargs)
+        self.assertEqual(template('pure.pov.jinja2', **kwargs), expected)
+
+    def test_fence_spans(self):
+        kwargs = dict(walls=[('MakeBlockX', (1, 2, 0), 3)], features=[], seed=5)
+        for name in ('brick', 'escher', 'fantasy', 'pure'):
+            with self.subTest(template=name):
+                source = template('{}.pov.jinja2'.format(name), **kwargs)
+                for macro in ('MakeBlockX (', 'MakeBlockXSpan (', 'MakeBlockY (', 'MakeBlockYSpan ('):
+                    self.assertEqual(source.count('#macro ' + macro), 1)
+                self.assertLess(source.index('#declare BlockX '), source.index('#macro MakeBlockXSpan'))
+
+    def test_compiled_once(self):
+        self.assertIs(
+            templates.get_template(RESOURCE_PACKAGE, 'pure.pov.jinja2'),
+            templates.get_template(RESOURCE_PACKAGE, 'pure.pov.jinja2'),
+        )
+
+
+class TestTemplateIllustrator(unittest.TestCase):
+    def test_dump_matches_make(self):
+        castle = CastleTwoLevel(8, 6)
+        illustrator = TemplateIllustrator('pure.pov.jinja2')
+
+        random.seed(3)
+        castle.draw(illustrator)
+        expected = illustrator.make()
+        illustrator.reset()
+
+        random.seed(3)
+        f = io.StringIO()
+        illustrator.dump(castle, f)
+        self.assertEqual(f.getvalue(), expected)
+
+
+class TestMergeRuns(unittest.TestCase):
+    def test_merge_runs(self):
+        walls = [
+            ('MakeWallX', (0.0, 1.0, 0)), ('MakeWallX', (1.0, 1.0, 0)), ('MakeArchX', (2.0, 1.0, 0)),
+            ('MakeWallY', (3.0, 0.0, 0)), ('MakeWallY', (3.0, 1.0, 0)), ('MakeWallY', (3.0, 3.0, 0)),
+        ]
+        self.assertEqual(list(merge_runs(walls)), [
+            ('MakeWallX', (0.0, 1.0, 0), 2), ('MakeArchX', (2.0, 1.0, 0), 1),
+            ('MakeWallY', (3.0, 0.0, 0), 2), ('MakeWallY', (3.0, 3.0, 0), 1),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from maze_builder.util import import_times, print_import_times
+
+
+class TestImportTimes(unittest.TestCase):
+    def test_first_imports(self):
+        with tempfile.TemporaryDirectory() as root:
+            for name, source in [('timed_outer', 'import timed_inner, os'), ('timed_inner', '')]:
+                with open(os.path.join(root, name + '.py'), 'w') as f:
+                    f.write(source)
+            sys.path.insert(0, root)
+            try:
+                with import_times() as times:
+                    import timed_outer
+                    import timed_outer
+            finally:
+                sys.path.remove(root)
+                sys.modules.pop('timed_outer', None)
+                sys.modules.pop('timed_inner', None)
+        self.assertEqual(sorted(times), ['timed_inner', 'timed_outer'])
+        self.assertGreaterEqual(times['timed_outer'], times['timed_inner'])
+
+    def test_print(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            print_import_times({'a': 0.5, 'b': 2.0, 'c': None, 'd': 1.0}, 3.0, limit=2)
+        self.assertEqual(out.getvalue().splitlines(), [
+            'Imported 3 modules while running for 3.000s; slowest (including their imports):',
+            '     2.000s  b',
+            '     1.000s  d',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()